@@ -109,6 +109,13 @@ JWT_TOKEN_NAME = os.environ.get('JWT_TOKEN_NAME') or 'jwt_python_flask'
 app.config['SECRET_KEY'] = SECRET_KEY
 app.config['SESSION_COOKIE_NAME'] = SESSION_COOKIE_NAME
 app.config['JWT_TOKEN_NAME'] = JWT_TOKEN_NAME
+# Seconds a verified JWT -> user lookup is reused by token_required (0 disables; bounds cross-worker staleness of role changes)
+app.config['JWT_CACHE_TTL'] = int(os.environ.get('JWT_CACHE_TTL') or 60)
+# Password hashing (see model/password_hasher.py; benchmark with scripts/bench_password_hash.py)
+# 'pbkdf2:sha256:<iterations>' | 'scrypt:<n>:<r>:<p>' | 'argon2' (needs argon2-cffi); existing hashes are upgraded on login
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+# Processes per worker for password verification (0 = verify on the request thread)
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS') or 0)
 
 # Cross-origin cookie support for authentication
 app.config['SESSION_COOKIE_SAMESITE'] = 'None'
@@ -157,6 +164,25 @@ app.config['DATA_FOLDER'] = os.path.join(app.instance_path, 'data')
 os.makedirs(app.config['DATA_FOLDER'], exist_ok=True)
 
 
+# DBS2 settings
+# Seconds an in-process leaderboard board may be served before reloading (bounds cross-worker staleness)
+app.config['DBS2_LEADERBOARD_TTL'] = int(os.environ.get('DBS2_LEADERBOARD_TTL') or 15)
+# Seconds /api/dbs2/admin/stats may be reused across dashboard refreshes (0 disables)
+app.config['DBS2_ADMIN_STATS_TTL'] = int(os.environ.get('DBS2_ADMIN_STATS_TTL') or 5)
+# Seconds between background CoinGecko price refreshes (prices older than this are revalidated)
+app.config['DBS2_PRICE_REFRESH_SECONDS'] = int(os.environ.get('DBS2_PRICE_REFRESH_SECONDS') or 120)
+# Opt-in group commit for Ash Trail run submissions: the first submitter waits up to this many ms
+# for others to join, up to BATCH_SIZE runs per batch. Default 0 writes each run immediately; only
+# worth enabling with many request threads per worker (a lone submission still pays the full wait)
+app.config['DBS2_ASHTRAIL_BATCH_WAIT_MS'] = int(os.environ.get('DBS2_ASHTRAIL_BATCH_WAIT_MS') or 0)
+app.config['DBS2_ASHTRAIL_BATCH_SIZE'] = int(os.environ.get('DBS2_ASHTRAIL_BATCH_SIZE') or 100)
+# Live leaderboards: committed score/wallet changes are POSTed to socket/socket_server.py, which pushes
+# rank diffs to subscribed clients (the socket server's /leaderboard/publish URL; unset disables)
+app.config['DBS2_LEADERBOARD_PUSH_URL'] = os.environ.get('DBS2_LEADERBOARD_PUSH_URL') or None
+app.config['DBS2_LEADERBOARD_PUSH_TOKEN'] = os.environ.get('DBS2_LEADERBOARD_PUSH_TOKEN') or None
+app.config['DBS2_LEADERBOARD_PUSH_INTERVAL_MS'] = int(os.environ.get('DBS2_LEADERBOARD_PUSH_INTERVAL_MS') or 100)
+
+
 # GITHUB settings
 app.config['GITHUB_API_URL'] = 'https://api.github.com'
 app.config['GITHUB_TOKEN'] = os.environ.get('GITHUB_TOKEN') or None
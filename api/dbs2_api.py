@@ -13,17 +13,30 @@ Works with the DBS2Player model structure that has:
 from flask import Blueprint, request, g
 from flask_restful import Api, Resource
 from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import undefer_group
 import requests
 import json
+import os
+import threading
 
 # Import your models and decorators
-from model.dbs2_player import DBS2Player, migrate_dbs2_players_add_scrap_columns
+from model.dbs2_player import (
+    DBS2Player,
+    DBS2MinigameScore,
+    migrate_dbs2_players_add_scrap_columns,
+    backfill_dbs2_minigame_scores,
+    seed_wallet_opening_balances,
+)
+from model.dbs2_leaderboard_cache import leaderboard_cache
 from model.user import User
-from model.ashtrail_run import AshTrailRun
-from __init__ import db
-from api.jwt_authorize import token_required
+from model.ashtrail_run import AshTrailRun, TRACE_LODS
+from model.ashtrail_ingest import new_run, insert_runs, run_ingest_buffer
+from model.wallet_transaction import WalletTransaction, WalletBalanceSnapshot
+from __init__ import app, db
+from api.jwt_authorize import token_required, user_from_token
+from api.price_refresher import PriceRefresher, SharedPriceFile
 from flask import current_app
-import jwt
 
 # Create Blueprint
 dbs2_api = Blueprint('dbs2_api', __name__, url_prefix='/api/dbs2')
@@ -88,11 +101,10 @@ MINIGAME_COINS = {
     'infinite_user': 'ethereum'
 }
 
-# Price cache
-_price_cache = {
-    'prices': {},
-    'last_fetch': None,
-    'cache_duration': timedelta(minutes=2)
+# Admin dashboard stats cache (short-lived; dashboard refreshes every few seconds)
+_admin_stats_cache = {
+    'stats': None,
+    'last_fetch': None
 }
 
 # Fallback sats per coin when price API fails (approx ratios so convert still works)
@@ -110,51 +122,91 @@ FALLBACK_SATS_PER_COIN = {
 # HELPER FUNCTIONS
 # ============================================================================
 
-def ensure_dbs2_tables():
-    """Create dbs2_players table if missing; add scrap columns if table exists with old schema."""
-    try:
-        DBS2Player.query.limit(1).first()
-    except Exception as e:
-        err_msg = str(e).lower()
-        if 'no such table' in err_msg:
-            try:
-                db.create_all()
-            except Exception as create_err:
-                print('[DBS2] ensure_dbs2_tables: create_all failed:', create_err)
-        elif 'no such column' in err_msg:
-            migrate_dbs2_players_add_scrap_columns()
-        else:
-            try:
+# Process-level flag: schema is checked once per process (startup or first DBS2 request), never per request
+_schema_state = {'verified': False}
+_schema_lock = threading.Lock()
+
+# Tables this blueprint needs; created by create_all() if missing (Alembic handles production upgrades)
+DBS2_SCHEMA_MODELS = (DBS2Player, DBS2MinigameScore, WalletTransaction, WalletBalanceSnapshot, AshTrailRun)
+
+
+def verify_dbs2_schema(force=False):
+    """
+    One-time schema check for the DBS2 and Ash Trail tables: one catalog lookup for
+    table names, create_all() for missing tables (backfilling dbs2_minigame_scores and
+    seeding wallet opening balances),
+    and the ad-hoc column migrations for databases created before those columns existed.
+    Runs at most once per process unless force=True; call from `flask custom migrate_dbs2`
+    at deploy time, and it also runs lazily before the first DBS2 request in each worker.
+    """
+    if _schema_state['verified'] and not force:
+        return
+    with _schema_lock:
+        if _schema_state['verified'] and not force:
+            return
+        try:
+            from sqlalchemy import inspect
+            insp = inspect(db.engine)
+            tables = set(insp.get_table_names())
+            missing = [m.__tablename__ for m in DBS2_SCHEMA_MODELS if m.__tablename__ not in tables]
+            if missing:
                 db.create_all()
+                print('[DBS2] Created tables:', ', '.join(missing))
+                if DBS2MinigameScore.__tablename__ in missing:
+                    backfill_dbs2_minigame_scores()
+                if WalletTransaction.__tablename__ in missing and DBS2Player.__tablename__ in tables:
+                    # Existing balances predate the ledger; record them as opening transactions
+                    seed_wallet_opening_balances()
+                    db.session.commit()
+                    print('[DBS2] Seeded wallet opening balances')
+            if DBS2Player.__tablename__ in tables:
                 migrate_dbs2_players_add_scrap_columns()
-            except Exception as create_err:
-                print('[DBS2] ensure_dbs2_tables failed:', create_err)
+            # Add ashtrail_runs columns added after the table (guest support, binary traces)
+            if AshTrailRun.__tablename__ in tables:
+                existing = {c['name'] for c in insp.get_columns(AshTrailRun.__tablename__)}
+                blob_type = 'MEDIUMBLOB' if db.engine.dialect.name == 'mysql' else 'BLOB'
+                for col_name, col_type in (('guest_name', 'VARCHAR(128)'), ('_trace_bin', blob_type),
+                                           ('_trace_med', blob_type), ('_trace_low', blob_type)):
+                    if col_name not in existing:
+                        db.session.execute(db.text(f'ALTER TABLE ashtrail_runs ADD COLUMN {col_name} {col_type}'))
+                        db.session.commit()
+                        print(f'[DBS2] Added {col_name} column to ashtrail_runs')
+                if 'ix_ashtrail_runs_book_score' not in {i['name'] for i in insp.get_indexes(AshTrailRun.__tablename__)}:
+                    db.session.execute(db.text(
+                        'CREATE INDEX ix_ashtrail_runs_book_score ON ashtrail_runs (book_id, score DESC, id)'))
+                    db.session.commit()
+                    print('[DBS2] Added ix_ashtrail_runs_book_score index')
+            _schema_state['verified'] = True
+        except Exception as e:
+            db.session.rollback()
+            # Leave the flag unset so the next request retries
+            print('[DBS2] verify_dbs2_schema failed:', e)
+
+
+@dbs2_api.before_request
+def _verify_schema_once():
+    if not _schema_state['verified']:
+        verify_dbs2_schema()
 
 
-def ensure_ashtrail_tables():
-    """Create ashtrail_runs table if missing (needed for Ash Trail ghost replays)."""
+@dbs2_api.after_request
+def commit_unit_of_work(response):
+    """Request-scoped unit of work: DBS2Player mutators only stage changes, so commit them
+    here exactly once for successful responses and roll back for error responses."""
+    if response.status_code >= 400:
+        db.session.rollback()
+        return response
     try:
-        AshTrailRun.query.limit(1).first()
+        db.session.commit()
     except Exception as e:
-        err_msg = str(e).lower()
-        if 'no such table' in err_msg or 'ashtrail' in err_msg:
-            try:
-                db.create_all()
-                print('[DBS2] Created ashtrail_runs table')
-            except Exception as create_err:
-                print('[DBS2] ensure_ashtrail_tables: create_all failed:', create_err)
-    # Add guest_name column if missing (for existing DBs created before guest support)
-    try:
-        from sqlalchemy import inspect
-        insp = inspect(db.engine)
-        if 'ashtrail_runs' in insp.get_table_names() and 'guest_name' not in [c['name'] for c in insp.get_columns('ashtrail_runs')]:
-            db.session.execute(db.text('ALTER TABLE ashtrail_runs ADD COLUMN guest_name VARCHAR(128)'))
-            db.session.commit()
-            print('[DBS2] Added guest_name column to ashtrail_runs')
-    except Exception as col_err:
         db.session.rollback()
-        # Column may already exist
-        pass
+        print('[DBS2] commit failed:', e)
+        response = current_app.response_class(
+            json.dumps({'error': 'Commit failed', 'message': str(e)}),
+            status=500,
+            mimetype='application/json'
+        )
+    return response
 
 
 def _optional_set_current_user():
@@ -169,46 +221,62 @@ def _optional_set_current_user():
     if not token:
         return
     try:
-        data = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
-        user = User.query.filter_by(_uid=data["_uid"]).first()
+        user = user_from_token(token)
         if user:
             g.current_user = user
     except Exception:
         pass
 
 
+# Shared guest user id, looked up once per process
+_guest_user = {'id': None}
+
+
 def get_guest_user_id():
-    """Get or create the shared guest user for unauthenticated Ash Trail runs."""
+    """Get or create the shared guest user for unauthenticated Ash Trail runs (cached for the process lifetime)."""
+    if _guest_user['id'] is not None:
+        return _guest_user['id']
     guest = User.query.filter_by(_uid='_ashtrail_guest').first()
     if not guest:
-        from werkzeug.security import generate_password_hash
         guest = User(
             name='Guest',
             uid='_ashtrail_guest',
-            password=generate_password_hash('no-login', 'pbkdf2:sha256', salt_length=10),
+            password='no-login',
             role='User'
         )
         guest.email = 'guest@ashtrail.local'
         db.session.add(guest)
         db.session.commit()
         print('[DBS2] Created ashtrail guest user')
+    _guest_user['id'] = guest.id
     return guest.id
 
 
-def get_current_player():
-    """Get DBS2Player for current authenticated user, create if doesn't exist.
-    If table is missing, create_all() and retry once.
+def _load_user_with_player(uid):
+    """load_user hook for player_required: user and DBS2Player in one query (player kept on g)"""
+    user, player = DBS2Player.load_with_user(uid)
+    g.current_player = player
+    return user
+
+
+def player_required(roles=None):
+    """
+    token_required variant for DBS2 resources: on a token cache miss the user and their
+    DBS2Player are fetched in one joined query; on a hit only the player is loaded
+    (with its user joined). get_current_player() then reuses that row, creating it if missing.
     """
-    if not g.current_user:
+    return token_required(roles, load_user=_load_user_with_player)
+
+
+def get_current_player():
+    """Get DBS2Player for current authenticated user, create if doesn't exist."""
+    if not getattr(g, 'current_user', None):
         return None
-    try:
-        return DBS2Player.get_or_create(g.current_user.id)
-    except Exception:
-        try:
-            db.create_all()
-            return DBS2Player.get_or_create(g.current_user.id)
-        except Exception:
-            raise
+    player = g.get('current_player')
+    if player is None or player.user_id != g.current_user.id:
+        player = DBS2Player.get_or_create(g.current_user.id)
+        g.current_player = player
+    return player
 
 
 def format_minigames(player):
@@ -233,56 +301,67 @@ def format_scraps_owned(player):
     }
 
 
-def fetch_coin_prices():
-    """Fetch current prices from CoinGecko with caching"""
-    now = datetime.now()
-    
-    # Return cached if valid
-    if (_price_cache['last_fetch'] and 
-        now - _price_cache['last_fetch'] < _price_cache['cache_duration'] and
-        _price_cache['prices']):
-        return _price_cache['prices']
-    
+def fetch_coingecko_prices():
+    """
+    Fetch current prices from CoinGecko. Network call - only the background
+    price refresher should call this; request handlers use fetch_coin_prices().
+    """
     # Build list of coingecko IDs
     coin_ids = [c['coingecko_id'] for c in SUPPORTED_COINS.values() if c['coingecko_id']]
     
-    try:
-        url = 'https://api.coingecko.com/api/v3/simple/price'
-        params = {
-            'ids': ','.join(coin_ids),
-            'vs_currencies': 'usd',
-            'include_24hr_change': 'true'
-        }
-        response = requests.get(url, params=params, timeout=5)
-        
-        if response.status_code == 200:
-            data = response.json()
-            prices = {}
-            
-            for coin_id, info in SUPPORTED_COINS.items():
-                cg_id = info['coingecko_id']
-                if cg_id and cg_id in data:
-                    prices[coin_id] = {
-                        'usd': data[cg_id].get('usd', 0),
-                        'change_24h': data[cg_id].get('usd_24h_change', 0)
-                    }
-                elif coin_id == 'satoshis':
-                    # Satoshis = 1/100,000,000 of Bitcoin
-                    btc_price = data.get('bitcoin', {}).get('usd', 0)
-                    prices['satoshis'] = {
-                        'usd': btc_price / 100_000_000,
-                        'change_24h': data.get('bitcoin', {}).get('usd_24h_change', 0)
-                    }
-            
-            _price_cache['prices'] = prices
-            _price_cache['last_fetch'] = now
-            return prices
-            
-    except Exception as e:
-        print(f'[DBS2] Price fetch error: {e}')
+    url = 'https://api.coingecko.com/api/v3/simple/price'
+    params = {
+        'ids': ','.join(coin_ids),
+        'vs_currencies': 'usd',
+        'include_24hr_change': 'true'
+    }
+    response = requests.get(url, params=params, timeout=5)
+    response.raise_for_status()
+    data = response.json()
+    prices = {}
     
-    # Return cached or empty
-    return _price_cache['prices'] or {}
+    for coin_id, info in SUPPORTED_COINS.items():
+        cg_id = info['coingecko_id']
+        if cg_id and cg_id in data:
+            prices[coin_id] = {
+                'usd': data[cg_id].get('usd', 0),
+                'change_24h': data[cg_id].get('usd_24h_change', 0)
+            }
+        elif coin_id == 'satoshis':
+            # Satoshis = 1/100,000,000 of Bitcoin
+            btc_price = data.get('bitcoin', {}).get('usd', 0)
+            prices['satoshis'] = {
+                'usd': btc_price / 100_000_000,
+                'change_24h': data.get('bitcoin', {}).get('usd_24h_change', 0)
+            }
+    return prices
+
+
+# Keeps prices warm in a background thread; swap .source for a stub in tests.
+# The shared file under DATA_FOLDER lets all workers share one upstream fetch and one price version.
+price_refresher = PriceRefresher(
+    source=fetch_coingecko_prices,
+    interval=app.config.get('DBS2_PRICE_REFRESH_SECONDS', 120),
+    store=SharedPriceFile(os.path.join(app.config['DATA_FOLDER'], 'dbs2_prices.json'))
+)
+
+
+def fetch_coin_prices():
+    """
+    Current prices from the background refresher. Never blocks on CoinGecko:
+    returns the last good prices (possibly stale, or {} before the first refresh,
+    in which case calculate_sats_per_coin falls back to FALLBACK_SATS_PER_COIN).
+    """
+    return price_refresher.get()
+
+
+def price_quote_info(snapshot):
+    """Version/timestamp of the prices a response was computed from"""
+    fetched_at = snapshot['fetched_at']
+    return {
+        'price_version': snapshot['version'],
+        'prices_updated_at': datetime.utcfromtimestamp(fetched_at).isoformat() if fetched_at else None
+    }
 
 
 def calculate_sats_per_coin(coin_id, prices):
@@ -308,7 +387,7 @@ def calculate_sats_per_coin(coin_id, prices):
 class _PlayerResource(Resource):
     """Get/Update current player's data"""
     
-    @token_required()
+    @player_required()
     def get(self):
         """GET /api/dbs2/player - Get current player's full data"""
         try:
@@ -319,7 +398,7 @@ class _PlayerResource(Resource):
         except Exception as e:
             return {'error': 'Player fetch failed', 'message': str(e)}, 500
     
-    @token_required()
+    @player_required()
     def put(self):
         """PUT /api/dbs2/player - Update player data"""
         player = get_current_player()
@@ -334,7 +413,7 @@ class _PlayerResource(Resource):
 class _CryptoResource(Resource):
     """Manage player's crypto currency (satoshis)"""
     
-    @token_required()
+    @player_required()
     def get(self):
         """GET /api/dbs2/crypto - Get current crypto balance"""
         player = get_current_player()
@@ -342,7 +421,7 @@ class _CryptoResource(Resource):
             return {'error': 'Not authenticated'}, 401
         return {'crypto': player._crypto}, 200
     
-    @token_required()
+    @player_required()
     def put(self):
         """PUT /api/dbs2/crypto - Update crypto"""
         player = get_current_player()
@@ -367,7 +446,7 @@ class _CryptoResource(Resource):
 class _WalletResource(Resource):
     """Manage player's multi-coin wallet"""
     
-    @token_required()
+    @player_required()
     def get(self):
         """GET /api/dbs2/wallet - Get full wallet"""
         player = get_current_player()
@@ -399,7 +478,7 @@ class _WalletResource(Resource):
             'raw_balances': wallet
         }, 200
     
-    @token_required()
+    @player_required()
     def put(self):
         """PUT /api/dbs2/wallet - Add to wallet balances"""
         player = get_current_player()
@@ -426,7 +505,7 @@ class _WalletResource(Resource):
 class _WalletAddCoinResource(Resource):
     """Add specific coin to wallet"""
     
-    @token_required()
+    @player_required()
     def post(self):
         """POST /api/dbs2/wallet/add - Add coin to wallet"""
         player = get_current_player()
@@ -456,7 +535,7 @@ class _WalletAddCoinResource(Resource):
 class _WalletConvertResource(Resource):
     """Convert between coins (5% fee)"""
     
-    @token_required()
+    @player_required()
     def post(self):
         """POST /api/dbs2/wallet/convert - Convert between coins (e.g. satoshis <-> SOL). 5% fee."""
         player = get_current_player()
@@ -486,8 +565,9 @@ class _WalletConvertResource(Resource):
         if amount > current_balance:
             return {'error': 'Insufficient balance'}, 400
         
-        # Get prices and calculate conversion
-        prices = fetch_coin_prices()
+        # Get prices and calculate conversion (one snapshot so both rates come from the same version)
+        price_snapshot = price_refresher.snapshot()
+        prices = price_snapshot['prices']
         from_sats = calculate_sats_per_coin(from_coin, prices)
         to_sats = calculate_sats_per_coin(to_coin, prices)
         
@@ -507,9 +587,10 @@ class _WalletConvertResource(Resource):
             decimals = SUPPORTED_COINS[to_coin]['decimals']
             received = round(received, decimals)
         
-        # Execute conversion
-        player.add_to_wallet(from_coin, -amount)
-        player.add_to_wallet(to_coin, received)
+        # Execute conversion: conditional debit (fails if a concurrent request spent the balance) + credit
+        if not player.debit(from_coin, amount):
+            return {'error': 'Insufficient balance'}, 400
+        player.credit(to_coin, received)
         
         return {
             'success': True,
@@ -518,10 +599,43 @@ class _WalletConvertResource(Resource):
             'to_coin': to_coin,
             'to_amount': received,
             'fee_percent': fee_rate * 100,
-            'wallet': player.wallet
+            'wallet': player.wallet,
+            **price_quote_info(price_snapshot)
         }, 200
 
 
+class _WalletHistoryResource(Resource):
+    """Wallet transaction history (keyset paginated)"""
+    
+    @player_required()
+    def get(self):
+        """GET /api/dbs2/wallet/history?limit=50&before=<created_at>,<id> - newest first"""
+        player = get_current_player()
+        if not player:
+            return {'error': 'Not authenticated'}, 401
+        
+        limit = _safe_limit(50, 200)
+        before = None
+        cursor = (request.args.get('before') or '').strip()
+        if cursor:
+            try:
+                created_at, txn_id = cursor.rsplit(',', 1)
+                before = (datetime.fromisoformat(created_at), int(txn_id))
+            except ValueError:
+                return {'error': 'Invalid cursor; expected before=<created_at>,<id>'}, 400
+        
+        rows, next_cursor = WalletTransaction.get_history(g.current_user.id, limit, before)
+        result = {
+            'transactions': [r.read() for r in rows],
+            'next_cursor': next_cursor,
+            'balances': player.wallet
+        }
+        if not before:
+            snapshot = WalletBalanceSnapshot.latest(g.current_user.id)
+            result['snapshot'] = snapshot.read() if snapshot else None
+        return result, 200
+
+
 # ============================================================================
 # PRICE ENDPOINTS (Public)
 # ============================================================================
@@ -531,7 +645,8 @@ class _PricesResource(Resource):
     
     def get(self):
         """GET /api/dbs2/prices - Get all coin prices"""
-        prices = fetch_coin_prices()
+        price_snapshot = price_refresher.snapshot()
+        prices = price_snapshot['prices']
         
         result = {}
         for coin_id, info in SUPPORTED_COINS.items():
@@ -544,7 +659,7 @@ class _PricesResource(Resource):
                 'sats_per_unit': calculate_sats_per_coin(coin_id, prices)
             }
         
-        return {'prices': result}, 200
+        return {'prices': result, **price_quote_info(price_snapshot)}, 200
 
 
 class _BitcoinBoostResource(Resource):
@@ -576,7 +691,7 @@ class _BitcoinBoostResource(Resource):
 class _InventoryResource(Resource):
     """Manage player's inventory"""
     
-    @token_required()
+    @player_required()
     def get(self):
         """GET /api/dbs2/inventory"""
         try:
@@ -587,7 +702,7 @@ class _InventoryResource(Resource):
         except Exception as e:
             return {'error': 'Inventory fetch failed', 'message': str(e)}, 500
     
-    @token_required()
+    @player_required()
     def post(self):
         """POST /api/dbs2/inventory - Add item"""
         player = get_current_player()
@@ -604,7 +719,7 @@ class _InventoryResource(Resource):
         player.add_inventory_item(item)
         return {'inventory': player.inventory}, 200
     
-    @token_required()
+    @player_required()
     def delete(self):
         """DELETE /api/dbs2/inventory - Remove item by index"""
         player = get_current_player()
@@ -624,7 +739,7 @@ class _InventoryResource(Resource):
 class _ScoresResource(Resource):
     """Manage player's game scores"""
     
-    @token_required()
+    @player_required()
     def get(self):
         """GET /api/dbs2/scores"""
         player = get_current_player()
@@ -632,7 +747,7 @@ class _ScoresResource(Resource):
             return {'error': 'Not authenticated'}, 401
         return {'scores': player.scores}, 200
     
-    @token_required()
+    @player_required()
     def put(self):
         """PUT /api/dbs2/scores - Update score for a game"""
         player = get_current_player()
@@ -648,7 +763,7 @@ class _ScoresResource(Resource):
         
         return {'scores': player.scores}, 200
 
-    @token_required()
+    @player_required()
     def post(self):
         """POST /api/dbs2/scores - Update score for a game (same as PUT; frontend uses POST)"""
         return self.put()
@@ -661,7 +776,7 @@ class _ScoresResource(Resource):
 class _MinigamesResource(Resource):
     """Track minigame completion"""
     
-    @token_required()
+    @player_required()
     def get(self):
         """GET /api/dbs2/minigames"""
         player = get_current_player()
@@ -669,7 +784,7 @@ class _MinigamesResource(Resource):
             return {'error': 'Not authenticated'}, 401
         return {'minigames_completed': format_minigames(player)}, 200
     
-    @token_required()
+    @player_required()
     def put(self):
         """PUT /api/dbs2/minigames - Mark minigame complete"""
         player = get_current_player()
@@ -701,7 +816,7 @@ class _MinigamesResource(Resource):
 class _MinigameCompleteResource(Resource):
     """Mark a single minigame as complete (POST body: { minigame: 'ash_trail' })"""
 
-    @token_required()
+    @player_required()
     def post(self):
         """POST /api/dbs2/minigames/complete - Mark one minigame complete"""
         player = get_current_player()
@@ -729,7 +844,7 @@ class _MinigameCompleteResource(Resource):
 class _MinigameRewardResource(Resource):
     """Reward player for minigame completion with appropriate coin"""
     
-    @token_required()
+    @player_required()
     def post(self):
         """POST /api/dbs2/minigame/reward - Award coin for minigame"""
         player = get_current_player()
@@ -747,7 +862,7 @@ class _MinigameRewardResource(Resource):
         coin_id = MINIGAME_COINS.get(minigame, 'satoshis')
         
         if amount > 0:
-            player.add_to_wallet(coin_id, amount)
+            player.credit(coin_id, amount)
         
         return {
             'success': True,
@@ -772,24 +887,19 @@ def _safe_limit(default=10, max_val=100):
         return default
 
 
+def _flag_arg(name):
+    """True for ?name=1|true|yes"""
+    return (request.args.get(name) or '').lower() in ('1', 'true', 'yes')
+
+
 class _LeaderboardResource(Resource):
     """Public leaderboard"""
     
     def get(self):
         """GET /api/dbs2/leaderboard?limit=10"""
         try:
-            ensure_dbs2_tables()
             limit = _safe_limit(10, 100)
-            leaderboard = DBS2Player.get_leaderboard(limit)
-            # Add minigames_completed format for frontend compatibility
-            for entry in leaderboard:
-                entry['minigames_completed'] = {
-                    'crypto_miner': entry.get('completed_crypto_miner', False),
-                    'infinite_user': entry.get('completed_infinite_user', False),
-                    'laundry': entry.get('completed_laundry', False),
-                    'ash_trail': entry.get('completed_ash_trail', False),
-                    'whackarat': entry.get('completed_whackarat', False)
-                }
+            leaderboard = leaderboard_cache.crypto_top(limit)
             return {'leaderboard': leaderboard}, 200
         except Exception as e:
             import traceback
@@ -804,41 +914,13 @@ class _MinigameLeaderboardResource(Resource):
     def get(self):
         """GET /api/dbs2/leaderboard/minigame?game=ash_trail&limit=10"""
         try:
-            ensure_dbs2_tables()
             game = (request.args.get('game') or '').strip()
             limit = _safe_limit(10, 100)
             if not game:
                 return {'error': 'Game parameter required'}, 400
             
-            players = DBS2Player.query.all()
-            entries = []
-            for player in players:
-                try:
-                    scores = player.scores
-                except Exception:
-                    scores = {}
-                if game in scores:
-                    user_info = {}
-                    if player.user:
-                        user_info = {
-                            'uid': getattr(player.user, '_uid', None),
-                            'name': getattr(player.user, '_name', None)
-                        }
-                    try:
-                        score_val = scores[game]
-                        if not isinstance(score_val, (int, float)):
-                            score_val = float(score_val) if score_val is not None else 0
-                    except (TypeError, ValueError):
-                        score_val = 0
-                    entries.append({
-                        'user_info': user_info,
-                        'score': score_val,
-                        'game': game
-                    })
-            entries.sort(key=lambda x: x['score'], reverse=True)
-            for i, entry in enumerate(entries[:limit]):
-                entry['rank'] = i + 1
-            return {'leaderboard': entries[:limit], 'game': game}, 200
+            entries = leaderboard_cache.minigame_top(game, limit)
+            return {'leaderboard': entries, 'game': game}, 200
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -854,71 +936,118 @@ class _AshTrailRunsResource(Resource):
     """Ash Trail run management"""
     
     def get(self):
-        """GET /api/dbs2/ash-trail/runs?book_id=defi_grimoire&limit=10"""
-        ensure_ashtrail_tables()
+        """GET /api/dbs2/ash-trail/runs?book_id=defi_grimoire&limit=10[&best_per_user=true]"""
         book_id = request.args.get('book_id', '')
         try:
             limit = min(int(request.args.get('limit', 10) or 10), 50)
         except (ValueError, TypeError):
             limit = 10
+        best_per_user = _flag_arg('best_per_user')
         
-        query = AshTrailRun.query
-        if book_id:
-            query = query.filter_by(book_id=book_id)
-        
-        runs = query.order_by(AshTrailRun.score.desc()).limit(limit).all()
+        runs = AshTrailRun.get_top_runs(book_id or None, limit, best_per_user)
         
         return {
             'book_id': book_id,
+            'best_per_user': best_per_user,
             'runs': [r.read(include_trace=False) for r in runs]
         }, 200
     
     def post(self):
         """POST /api/dbs2/ash-trail/runs - Submit a run (authenticated or guest)"""
-        ensure_ashtrail_tables()
         _optional_set_current_user()
 
         data = request.get_json() or {}
-        book_id = data.get('book_id', '')
+        run, error = _build_ashtrail_run(data)
+        if error:
+            return {'error': error}, 400
+
+        # Grouped with concurrent submissions into one INSERT transaction
+        payload = run_ingest_buffer.submit(run)
+        payload['trace'] = data.get('trace') if isinstance(data.get('trace'), list) else []
+        return {'success': True, 'run': payload}, 201
+
+
+class _AshTrailRunsBatchResource(Resource):
+    """Submit many Ash Trail runs in one call"""
+    
+    MAX_RUNS = 100
+    
+    def post(self):
+        """POST /api/dbs2/ash-trail/runs/batch - {"runs": [{book_id, score, trace, guest_name}, ...]}"""
+        _optional_set_current_user()
+        
+        data = request.get_json() or {}
+        items = data.get('runs')
+        if not isinstance(items, list) or not items:
+            return {'error': 'runs must be a non-empty list'}, 400
+        if len(items) > self.MAX_RUNS:
+            return {'error': f'At most {self.MAX_RUNS} runs per batch'}, 400
+        
+        runs = []
+        for i, item in enumerate(items):
+            run, error = _build_ashtrail_run(item if isinstance(item, dict) else {})
+            if error:
+                return {'error': f'runs[{i}]: {error}'}, 400
+            runs.append(run)
+        
+        # One multi-row INSERT, one commit
+        payloads = insert_runs(runs)
+        return {'success': True, 'runs': payloads}, 201
+
+
+def _build_ashtrail_run(data):
+    """Validate one submitted run; returns (transient AshTrailRun, None) or (None, error message)"""
+    book_id = data.get('book_id', '')
+    if not book_id:
+        return None, 'book_id required'
+    try:
         score = float(data.get('score', 0))
-        trace = data.get('trace', [])
-        guest_name = (data.get('guest_name') or '').strip()[:128]  # For unauthenticated runs
+    except (ValueError, TypeError):
+        return None, 'score must be a number'
+    guest_name = (data.get('guest_name') or '').strip()[:128]  # For unauthenticated runs
 
-        if not book_id:
-            return {'error': 'book_id required'}, 400
+    if getattr(g, 'current_user', None):
+        user_id = g.current_user.id
+        run_guest_name = None  # Authenticated users use their profile name
+    else:
+        user_id = get_guest_user_id()
+        run_guest_name = guest_name or 'Guest'
 
-        if getattr(g, 'current_user', None):
-            user_id = g.current_user.id
-            run_guest_name = None  # Authenticated users use their profile name
-        else:
-            user_id = get_guest_user_id()
-            run_guest_name = guest_name or 'Guest'
-
-        run = AshTrailRun(
-            user_id=user_id,
-            book_id=book_id,
-            score=score,
-            guest_name=run_guest_name
-        )
-        run.trace = trace
+    # Setting the trace also precomputes the low/med (RDP-simplified) replay traces
+    return new_run(user_id, book_id, score, data.get('trace', []), run_guest_name), None
 
-        db.session.add(run)
-        db.session.commit()
 
-        return {'success': True, 'run': run.read(include_trace=True)}, 201
+class _AshTrailLeaderboardResource(Resource):
+    """Top runs for every book in one round trip"""
+    
+    def get(self):
+        """GET /api/dbs2/ash-trail/leaderboard?limit=5[&best_per_user=true] - {book_id: [runs]}"""
+        limit = _safe_limit(5, 50)
+        best_per_user = _flag_arg('best_per_user')
+        
+        boards = AshTrailRun.get_top_runs_by_book(limit, best_per_user)
+        
+        return {
+            'best_per_user': best_per_user,
+            'books': {book_id: [r.read(include_trace=False) for r in runs] for book_id, runs in boards.items()}
+        }, 200
 
 
 class _AshTrailRunDetailResource(Resource):
     """Get specific Ash Trail run with trace"""
     
     def get(self, run_id):
-        """GET /api/dbs2/ash-trail/runs/<run_id>"""
-        ensure_ashtrail_tables()
-        run = AshTrailRun.query.get(run_id)
+        """GET /api/dbs2/ash-trail/runs/<run_id>?lod=low|med|full (default full)"""
+        lod = (request.args.get('lod') or 'full').strip().lower()
+        if lod not in TRACE_LODS:
+            return {'error': 'lod must be one of: ' + ', '.join(TRACE_LODS)}, 400
+        # Only the requested level's column is loaded (simplified traces are precomputed on submit)
+        run = AshTrailRun.query.options(undefer_group(AshTrailRun.trace_group(lod))).filter_by(id=run_id).first()
         if not run:
             return {'error': 'Run not found'}, 404
         
-        return {'run': run.read(include_trace=True)}, 200
+        # Trace goes from storage to the response body without a JSON parse/re-serialize
+        return current_app.response_class(run.read_json(lod), status=200, mimetype='application/json')
 
 
 class _AshTrailAIResource(Resource):
@@ -943,21 +1072,22 @@ class _AdminAllPlayers(Resource):
     """Get all players for admin panel"""
     
     def get(self):
-        """GET /api/dbs2/admin/players"""
+        """GET /api/dbs2/admin/players[?view=full] - column projection by default, full read() with view=full"""
         try:
-            ensure_dbs2_tables()
-            players = DBS2Player.query.all()
-            result = []
-            for player in players:
-                try:
-                    data = player.read()
-                    data['minigames_completed'] = format_minigames(player)
-                    data['scraps_owned'] = format_scraps_owned(player)
-                    result.append(data)
-                except Exception as row_err:
-                    print('[DBS2] admin/players row error:', row_err)
-                    continue
-            result.sort(key=lambda x: x.get('crypto', 0), reverse=True)
+            if (request.args.get('view') or '').lower() == 'full':
+                # Full player.read() payloads (inventory etc.), users joined in the same query
+                result = []
+                for player in DBS2Player.query_with_user().order_by(DBS2Player._crypto.desc()).all():
+                    try:
+                        data = player.read()
+                        data['minigames_completed'] = format_minigames(player)
+                        data['scraps_owned'] = format_scraps_owned(player)
+                        result.append(data)
+                    except Exception as row_err:
+                        print('[DBS2] admin/players row error:', row_err)
+                        continue
+            else:
+                result = DBS2Player.read_summaries()
             return {'players': result, 'count': len(result)}, 200
         except Exception as e:
             import traceback
@@ -1048,6 +1178,7 @@ class _AdminPlayerDetail(Resource):
                     player._scores = json.dumps(scores)
                 else:
                     player._scores = scores
+                player.sync_minigame_scores()
             
             # Handle minigame completions
             if 'completed_crypto_miner' in data:
@@ -1098,7 +1229,6 @@ class _AdminPlayerDetail(Resource):
     def delete(self, user_id):
         """DELETE /api/dbs2/admin/player/<user_id> - Remove player from leaderboard and delete their DBS2 data."""
         try:
-            ensure_ashtrail_tables()  # ensure guest_name column exists before querying AshTrailRun
             user = User.query.filter_by(_uid=user_id).first()
             if not user:
                 try:
@@ -1126,64 +1256,19 @@ class _AdminStats(Resource):
     """Get overall game statistics"""
     
     def get(self):
-        """GET /api/dbs2/admin/stats"""
+        """GET /api/dbs2/admin/stats[?refresh=true] - cached for DBS2_ADMIN_STATS_TTL seconds"""
         try:
-            ensure_dbs2_tables()
-            players = DBS2Player.query.all()
-            
-            total_players = len(players)
-            total_crypto = sum(getattr(p, '_crypto', 0) for p in players)
-            avg_crypto = total_crypto / total_players if total_players > 0 else 0
-            
-            # Sum wallet totals (getattr for missing columns / old schema)
-            wallet_totals = {
-                'satoshis': total_crypto,
-                'bitcoin': sum(getattr(p, '_wallet_btc', 0) or 0 for p in players),
-                'ethereum': sum(getattr(p, '_wallet_eth', 0) or 0 for p in players),
-                'solana': sum(getattr(p, '_wallet_sol', 0) or 0 for p in players),
-                'cardano': sum(getattr(p, '_wallet_ada', 0) or 0 for p in players),
-                'dogecoin': sum(getattr(p, '_wallet_doge', 0) or 0 for p in players)
-            }
-            
-            # Count minigame completions
-            minigame_counts = {
-                'crypto_miner': sum(1 for p in players if getattr(p, '_completed_crypto_miner', False)),
-                'infinite_user': sum(1 for p in players if getattr(p, '_completed_infinite_user', False)),
-                'laundry': sum(1 for p in players if getattr(p, '_completed_laundry', False)),
-                'ash_trail': sum(1 for p in players if getattr(p, '_completed_ash_trail', False)),
-                'whackarat': sum(1 for p in players if getattr(p, '_completed_whackarat', False))
-            }
-            
-            # Count scrap ownership
-            scrap_counts = {
-                'crypto_miner': sum(1 for p in players if getattr(p, '_scrap_crypto_miner', False)),
-                'whackarat': sum(1 for p in players if getattr(p, '_scrap_whackarat', False)),
-                'laundry': sum(1 for p in players if getattr(p, '_scrap_laundry', False)),
-                'ash_trail': sum(1 for p in players if getattr(p, '_scrap_ash_trail', False)),
-                'infinite_user': sum(1 for p in players if getattr(p, '_scrap_infinite_user', False))
-            }
-            
-            # Top players (getattr for _crypto in case of old schema)
-            sorted_players = sorted(players, key=lambda p: getattr(p, '_crypto', 0), reverse=True)[:5]
-            top_players = []
-            for p in sorted_players:
-                if p.user:
-                    top_players.append({
-                        'uid': getattr(p.user, '_uid', 'unknown'),
-                        'name': getattr(p.user, '_name', 'Unknown'),
-                        'crypto': getattr(p, '_crypto', 0),
-                        'wallet': p.wallet
-                    })
-            
-            return {
-                'total_players': total_players,
-                'total_crypto_in_circulation': total_crypto,
-                'average_crypto': round(avg_crypto, 2),
-                'wallet_totals': wallet_totals,
-                'minigame_completions': minigame_counts,
-                'scrap_ownership': scrap_counts,
-                'top_players': top_players
-            }, 200
+            ttl = current_app.config.get('DBS2_ADMIN_STATS_TTL', 0)
+            refresh = _flag_arg('refresh')
+            now = datetime.now()
+            if (ttl > 0 and not refresh and _admin_stats_cache['stats'] is not None and
+                    now - _admin_stats_cache['last_fetch'] < timedelta(seconds=ttl)):
+                return _admin_stats_cache['stats'], 200
+            
+            stats = DBS2Player.get_stats(top_n=5)
+            _admin_stats_cache['stats'] = stats
+            _admin_stats_cache['last_fetch'] = now
+            return stats, 200
             
         except Exception as e:
             import traceback
@@ -1215,57 +1300,55 @@ class _AdminBulkUpdate(Resource):
             if not action:
                 return {'error': 'Action required'}, 400
             
-            players = DBS2Player.query.all()
-            affected = 0
-            
             if action == 'add_crypto':
-                for player in players:
-                    player._crypto = max(0, player._crypto + int(amount))
-                    affected += 1
+                values = {
+                    DBS2Player._crypto: DBS2Player.non_negative(
+                        func.coalesce(DBS2Player._crypto, 0) + int(amount))
+                }
             
             elif action == 'add_coin':
-                for player in players:
-                    player.add_to_wallet(coin, amount)
-                    affected += 1
+                if coin not in SUPPORTED_COINS:
+                    return {'error': f'Unknown coin: {coin}'}, 400
+                column = getattr(DBS2Player, SUPPORTED_COINS[coin]['field'])
+                delta = int(amount) if coin == 'satoshis' else float(amount)
+                values = {column: DBS2Player.non_negative(func.coalesce(column, 0) + delta)}
             
             elif action == 'set_crypto':
-                for player in players:
-                    player._crypto = max(0, int(amount))
-                    affected += 1
+                values = {DBS2Player._crypto: max(0, int(amount))}
             
             elif action == 'reset_all':
-                for player in players:
-                    player._crypto = 0
-                    player._wallet_btc = 0.0
-                    player._wallet_eth = 0.0
-                    player._wallet_sol = 0.0
-                    player._wallet_ada = 0.0
-                    player._wallet_doge = 0.0
-                    player._inventory = '[]'
-                    player._scores = '{}'
-                    player._completed_ash_trail = False
-                    player._completed_crypto_miner = False
-                    player._completed_whackarat = False
-                    player._completed_laundry = False
-                    player._completed_infinite_user = False
-                    player._completed_all = False
+                values = {
+                    DBS2Player._crypto: 0,
+                    DBS2Player._wallet_btc: 0.0,
+                    DBS2Player._wallet_eth: 0.0,
+                    DBS2Player._wallet_sol: 0.0,
+                    DBS2Player._wallet_ada: 0.0,
+                    DBS2Player._wallet_doge: 0.0,
+                    DBS2Player._inventory: '[]',
+                    DBS2Player._scores: '{}',
+                    DBS2Player._completed_ash_trail: False,
+                    DBS2Player._completed_crypto_miner: False,
+                    DBS2Player._completed_whackarat: False,
+                    DBS2Player._completed_laundry: False,
+                    DBS2Player._completed_infinite_user: False,
+                    DBS2Player._completed_all: False,
                     # Also reset scraps
-                    if hasattr(player, '_scrap_crypto_miner'):
-                        player._scrap_crypto_miner = False
-                    if hasattr(player, '_scrap_whackarat'):
-                        player._scrap_whackarat = False
-                    if hasattr(player, '_scrap_laundry'):
-                        player._scrap_laundry = False
-                    if hasattr(player, '_scrap_ash_trail'):
-                        player._scrap_ash_trail = False
-                    if hasattr(player, '_scrap_infinite_user'):
-                        player._scrap_infinite_user = False
-                    affected += 1
+                    DBS2Player._scrap_crypto_miner: False,
+                    DBS2Player._scrap_whackarat: False,
+                    DBS2Player._scrap_laundry: False,
+                    DBS2Player._scrap_ash_trail: False,
+                    DBS2Player._scrap_infinite_user: False
+                }
             
             else:
                 return {'error': f'Unknown action: {action}'}, 400
             
+            # One transaction: set-based UPDATE(s) + (for reset) clearing the score table
+            affected = DBS2Player.bulk_update(values)
+            if action == 'reset_all':
+                DBS2MinigameScore.query.delete(synchronize_session=False)
             db.session.commit()
+            leaderboard_cache.invalidate()
             
             return {'message': f'{action} completed', 'affected_players': affected}, 200
             
@@ -1358,6 +1441,7 @@ class _AdminPlayerSimple(Resource):
                     player._scores = json.dumps(scores)
                 else:
                     player._scores = scores
+                player.sync_minigame_scores()
             
             # Handle minigame completions
             if 'completed_crypto_miner' in data:
@@ -1468,7 +1552,7 @@ SHOP_ITEMS = {
 class _ShopPurchaseResource(Resource):
     """Handle shop purchases - sets scrap ownership field OR adds character to inventory"""
     
-    @token_required()
+    @player_required()
     def post(self):
         """POST /api/dbs2/shop/purchase - Buy an item from the shop"""
         try:
@@ -1516,9 +1600,12 @@ class _ShopPurchaseResource(Resource):
                         'error': f'Insufficient {price_coin}. Need {price_amount}, have {current_balance}'
                     }, 400
                 
-                # Deduct the price
-                new_balance = current_balance - price_amount
-                setattr(player, coin_field, new_balance)
+                # Deduct the price atomically (guards against concurrent spends)
+                if not player.debit(price_coin, price_amount):
+                    return {
+                        'error': f'Insufficient {price_coin}. Need {price_amount}, have {current_balance}'
+                    }, 400
+                new_balance = getattr(player, coin_field, 0) or 0
                 
                 # Add character to inventory
                 inventory.append({
@@ -1565,13 +1652,16 @@ class _ShopPurchaseResource(Resource):
                         'error': f'Insufficient {price_coin}. Need {price_amount}, have {current_balance}'
                     }, 400
                 
-                # Deduct the price
-                new_balance = current_balance - price_amount
-                setattr(player, coin_field, new_balance)
-                
-                # Mark scrap as owned
-                if scrap_field and hasattr(player, scrap_field):
-                    setattr(player, scrap_field, True)
+                # Deduct the price and mark the scrap owned in one conditional UPDATE
+                if not player.debit(price_coin, price_amount,
+                                    set_flag=scrap_field if scrap_field and hasattr(player, scrap_field) else None):
+                    db.session.expire(player)
+                    if scrap_field and getattr(player, scrap_field, False):
+                        return {'error': 'You already own this code scrap'}, 400
+                    return {
+                        'error': f'Insufficient {price_coin}. Need {price_amount}, have {getattr(player, coin_field, 0) or 0}'
+                    }, 400
+                new_balance = getattr(player, coin_field, 0) or 0
                 
                 db.session.commit()
                 
@@ -1595,7 +1685,7 @@ class _ShopPurchaseResource(Resource):
 class _ShopItemsResource(Resource):
     """Get available shop items with ownership status"""
     
-    @token_required()
+    @player_required()
     def get(self):
         """GET /api/dbs2/shop/items - Get shop items with ownership status"""
         try:
@@ -1639,7 +1729,7 @@ class _ShopItemsResource(Resource):
 class _EquipCharacterResource(Resource):
     """Equip a character from inventory"""
     
-    @token_required()
+    @player_required()
     def post(self):
         """POST /api/dbs2/equip_character"""
         try:
@@ -1687,7 +1777,7 @@ class _EquipCharacterResource(Resource):
 class _GetEquippedCharacterResource(Resource):
     """Get currently equipped character"""
     
-    @token_required()
+    @player_required()
     def get(self):
         """GET /api/dbs2/equipped_character"""
         try:
@@ -1707,7 +1797,7 @@ class _GetEquippedCharacterResource(Resource):
 class _GetOwnedCharactersResource(Resource):
     """Get list of owned characters"""
     
-    @token_required()
+    @player_required()
     def get(self):
         """GET /api/dbs2/owned_characters"""
         try:
@@ -1752,6 +1842,7 @@ api.add_resource(_MinigameRewardResource, '/minigame/reward')
 api.add_resource(_WalletResource, '/wallet')
 api.add_resource(_WalletAddCoinResource, '/wallet/add')
 api.add_resource(_WalletConvertResource, '/wallet/convert')
+api.add_resource(_WalletHistoryResource, '/wallet/history')
 
 # Shop endpoints (authenticated)
 api.add_resource(_ShopPurchaseResource, '/shop/purchase')
@@ -1770,7 +1861,9 @@ api.add_resource(_BitcoinBoostResource, '/bitcoin-boost')
 
 # Ash Trail endpoints
 api.add_resource(_AshTrailRunsResource, '/ash-trail/runs')
+api.add_resource(_AshTrailRunsBatchResource, '/ash-trail/runs/batch')
 api.add_resource(_AshTrailRunDetailResource, '/ash-trail/runs/<int:run_id>')
+api.add_resource(_AshTrailLeaderboardResource, '/ash-trail/leaderboard')
 api.add_resource(_AshTrailAIResource, '/ash-trail/ai')
 
 # Admin endpoints
@@ -1,10 +1,168 @@
 from flask import request
 from flask import current_app, g
 from functools import wraps
+from collections import OrderedDict
+import threading
+import time
 import jwt
+from sqlalchemy import event
+from werkzeug.exceptions import Unauthorized
+from __init__ import db
 from model.user import User
 
-def token_required(roles=None):
+
+class UserNotFound(Unauthorized, LookupError):
+    """
+    A cached token's user was deleted (e.g. by another worker). Raised on first use
+    of the User row; token_required answers 401, and as an Unauthorized it is a 401
+    wherever else it surfaces (optional-auth endpoints).
+    """
+
+
+class CurrentUser:
+    """
+    Stand-in for the User row on g.current_user, built from a cached snapshot.
+    id/uid/role/name are served from the snapshot without touching the database;
+    any other attribute or method (update(), read(), sections, ...) loads the
+    User row on first use and delegates to it.
+    """
+    __slots__ = ('_snapshot', '_user')
+
+    def __init__(self, snapshot, user=None):
+        object.__setattr__(self, '_snapshot', snapshot)
+        object.__setattr__(self, '_user', user)
+
+    @property
+    def user(self):
+        """The underlying User row (loaded on first use)"""
+        if self._user is None:
+            user = db.session.get(User, self._snapshot['id'])
+            if user is None:
+                # Stop serving the deleted user from the cache
+                token_cache.invalidate_user(self._snapshot['id'])
+                raise UserNotFound(f"User {self._snapshot['uid']} no longer exists")
+            object.__setattr__(self, '_user', user)
+        return self._user
+
+    @property
+    def id(self):
+        return self._snapshot['id']
+
+    @property
+    def uid(self):
+        return self._user.uid if self._user is not None else self._snapshot['uid']
+
+    @property
+    def _uid(self):
+        return self.uid
+
+    @property
+    def role(self):
+        return self._user.role if self._user is not None else self._snapshot['role']
+
+    @property
+    def name(self):
+        return self._user.name if self._user is not None else self._snapshot['name']
+
+    def __getattr__(self, name):
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+
+    def __eq__(self, other):
+        return isinstance(other, (User, CurrentUser)) and other.id == self.id
+
+    def __hash__(self):
+        return hash(('User', self.id))
+
+    def __str__(self):
+        return str(self.user)
+
+    def __repr__(self):
+        return f"<CurrentUser {self._snapshot['uid']} id={self.id}>"
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified tokens -> user snapshot, so authenticated requests skip the
+    JWT decode and the User lookup. Entries expire after JWT_CACHE_TTL seconds (or at the
+    token's exp, if sooner) and are dropped when the user row is updated or deleted in this
+    process; the TTL bounds staleness for changes made by other workers.
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._entries = OrderedDict()   # token -> (expires_at, snapshot)
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return entry[1]
+
+    def put(self, token, snapshot, expires_at):
+        with self._lock:
+            self._entries[token] = (expires_at, snapshot)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            stale = [token for token, (_, snap) in self._entries.items() if snap['id'] == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_cached_tokens(mapper, connection, target):
+    token_cache.invalidate_user(target.id)
+
+
+def user_from_token(token, load_user=None):
+    """
+    Resolve a JWT to the current user (a CurrentUser), or None if the token's user no longer exists.
+    load_user(uid) -> User replaces the default users lookup on a cache miss (see DBS2's player_required).
+    Raises jwt exceptions for invalid or expired tokens.
+    """
+    ttl = current_app.config.get('JWT_CACHE_TTL', 60)
+    if ttl > 0:
+        snapshot = token_cache.get(token)
+        if snapshot is not None:
+            return CurrentUser(snapshot)
+
+    data = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
+    if load_user is not None:
+        user = load_user(data["_uid"])
+    else:
+        user = User.query.filter_by(_uid=data["_uid"]).first()
+    if user is None:
+        return None
+    snapshot = {'id': user.id, 'uid': user._uid, 'role': user._role, 'name': user._name}
+    if ttl > 0:
+        expires_at = time.time() + ttl
+        if data.get('exp'):
+            expires_at = min(expires_at, data['exp'])
+        token_cache.put(token, snapshot, expires_at)
+    return CurrentUser(snapshot, user)
+
+
+def token_required(roles=None, load_user=None):
     '''
     This function is used to guard API endpoints that require authentication.
     Here is how it works:
@@ -14,8 +172,10 @@ def token_required(roles=None):
       4. checks if the user has the required role
       5. set the current_user in the global context (Flask's g object)
       6. returns the decorated function if all checks pass
+    load_user(uid) -> User optionally replaces the users lookup in step 3 (e.g. to load related rows in the same query).
     Here are some possible error responses:    
       A. 401 / Unauthorized: token is missing or invalid
+         (or the token's user was deleted while its token was cached)
       B. 403 / Forbidden: user has insufficient permissions
       C. 500 / Internal Server Error: something went wrong with the token decoding
     '''
@@ -37,9 +197,8 @@ def token_required(roles=None):
                     "error": "Unauthorized"
                 }, 401
             try:
-                # Decode the token and retrieve the user data
-                data = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
-                current_user = User.query.filter_by(_uid=data["_uid"]).first()
+                # Decode the token and retrieve the user data (cached per token, see TokenCache)
+                current_user = user_from_token(token, load_user)
                 if current_user is None:
                     return {
                         "message": "Invalid Authentication token!",
@@ -76,7 +235,15 @@ def token_required(roles=None):
             # Success, return to the decorated function
             # func_to_guard is the function with the @token_required
             # func_to_guard returns with the original function arguments
-            return func_to_guard(*args, **kwargs)
+            try:
+                return func_to_guard(*args, **kwargs)
+            except UserNotFound:
+                # The cached user was deleted since the token was cached
+                return {
+                    "message": "Invalid Authentication token!",
+                    "data": None,
+                    "error": "Unauthorized"
+                }, 401
 
         return decorated
 
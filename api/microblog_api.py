@@ -78,7 +78,7 @@ class MicroBlogAPI:
       
        @token_required()
        def get(self):
-           """Get micro blog posts with optional filtering"""
+           """Get micro blog posts with optional filtering (newest first; pass nextCursor back as ?before= for the next page)"""
            # Query parameters
            limit = request.args.get('limit', 200, type=int)
            topic_id = request.args.get('topicId', type=int)
@@ -86,24 +86,30 @@ class MicroBlogAPI:
            user_id = request.args.get('userId', type=int)
            search = request.args.get('search')
           
+           try:
+               before = MicroBlog.parse_cursor(request.args.get('before'))
+           except ValueError:
+               return {'message': 'Invalid cursor: expected before=<timestamp>,<id>'}, 400
+          
            try:
                if search:
-                   microblogs = MicroBlog.search_content(search, limit)
+                   microblogs = MicroBlog.search_content(search, limit, before)
                elif topic_id:
-                   microblogs = MicroBlog.get_by_topic(topic_id, limit)
+                   microblogs = MicroBlog.get_by_topic(topic_id, limit, before)
                elif page_path:
                    topic = Topic.get_by_page_path(page_path)
                    if topic:
-                       microblogs = MicroBlog.get_by_topic(topic.id, limit)
+                       microblogs = MicroBlog.get_by_topic(topic.id, limit, before)
                    else:
                        microblogs = []
                elif user_id:
-                   microblogs = MicroBlog.get_by_user(user_id, limit)
+                   microblogs = MicroBlog.get_by_user(user_id, limit, before)
                else:
-                   microblogs = MicroBlog.get_all(limit)
+                   microblogs = MicroBlog.get_all(limit, before)
                return jsonify({
                    'microblogs': microblogs,
-                   'count': len(microblogs)
+                   'count': len(microblogs),
+                   'nextCursor': MicroBlog.next_cursor(microblogs, limit)
                })
            except Exception as e:
                return {'message': f'Error retrieving micro blog posts: {str(e)}'}, 500
@@ -474,6 +480,10 @@ class TopicAPI:
           
            # Query parameters
            limit = request.args.get('limit', 20, type=int)
+           try:
+               before = MicroBlog.parse_cursor(request.args.get('before'))
+           except ValueError:
+               return {'message': 'Invalid cursor: expected before=<timestamp>,<id>'}, 400
           
            try:
                # Get topic by page key
@@ -490,7 +500,7 @@ class TopicAPI:
               
                # Get recent posts for this topic
                user_id = current_user.id if current_user else None
-               posts = topic.get_recent_posts(limit=limit, user_id=user_id)
+               posts = topic.get_recent_posts(limit=limit, user_id=user_id, before=before)
               
                # Check if user can post more messages
                can_post = False
@@ -501,6 +511,7 @@ class TopicAPI:
                    'topic': topic.read(),
                    'microblogs': posts,
                    'count': len(posts),
+                   'nextCursor': MicroBlog.next_cursor(posts, limit),
                    'canPost': can_post,
                    'userPostCount': topic.get_user_post_count(user_id) if user_id else 0
                })
@@ -523,26 +534,33 @@ class TopicAPI:
            page_path = request.args.get('pagePath')
 
 
+           try:
+               before = MicroBlog.parse_cursor(request.args.get('before'))
+           except ValueError:
+               return {'message': 'Invalid cursor: expected before=<timestamp>,<id>'}, 400
+
+
            try:
                if search:
-                   microblogs = MicroBlog.search_content(search, limit)
+                   microblogs = MicroBlog.search_content(search, limit, before)
                elif topic_id:
-                   microblogs = MicroBlog.get_by_topic(topic_id, limit)
+                   microblogs = MicroBlog.get_by_topic(topic_id, limit, before)
                elif page_path:
                    topic = Topic.get_by_page_path(page_path)
                    if topic:
-                       microblogs = MicroBlog.get_by_topic(topic.id, limit)
+                       microblogs = MicroBlog.get_by_topic(topic.id, limit, before)
                    else:
-                       return jsonify({'microblogs': [], 'count': 0, 'message': 'No topic found for this pagePath'}), 200
+                       return jsonify({'microblogs': [], 'count': 0, 'nextCursor': None, 'message': 'No topic found for this pagePath'}), 200
                elif user_id:
-                   microblogs = MicroBlog.get_by_user(user_id, limit)
+                   microblogs = MicroBlog.get_by_user(user_id, limit, before)
                else:
-                   microblogs = MicroBlog.get_all(limit)
+                   microblogs = MicroBlog.get_all(limit, before)
 
 
                return jsonify({
                    'microblogs': microblogs,
-                   'count': len(microblogs)
+                   'count': len(microblogs),
+                   'nextCursor': MicroBlog.next_cursor(microblogs, limit)
                })
 
 
@@ -0,0 +1,216 @@
+"""
+Background price refresher for the DBS2 wallet endpoints.
+
+Keeps coin prices warm off the request path:
+- a daemon thread calls the price source every `interval` seconds
+- get() never touches the network; it returns the last good prices (possibly stale)
+  and, when they are older than `interval`, wakes the thread to revalidate
+- single-flight: only one refresh runs at a time per process, however many
+  requests see stale data
+
+With a SharedPriceFile store, every gunicorn worker reads the same JSON file under
+DATA_FOLDER. The file carries a version and fetched_at timestamp; whichever worker
+first sees it stale takes an flock and fetches upstream, and the others adopt the
+new version on their next read. Upstream load is one fetch per interval no matter
+how many workers run, and all workers quote the same prices.
+
+The source is any zero-argument callable returning {coin_id: {'usd': ..., 'change_24h': ...}},
+so tests can pass a local stub instead of CoinGecko:
+
+    refresher = PriceRefresher(lambda: {'bitcoin': {'usd': 1, 'change_24h': 0}}, interval=1)
+    refresher.refresh_now()
+    refresher.get()
+"""
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class SharedPriceFile:
+    """Atomically replaced JSON price file: {'version', 'fetched_at', 'prices'}"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+
+    def mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def read(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or not isinstance(data.get('prices'), dict):
+            return None
+        return data
+
+    def write(self, data):
+        # Write to a temp file in the same folder, then rename over the old file:
+        # readers see either the old or the new file, never a partial one
+        fd, tmp = tempfile.mkstemp(prefix='.prices-', dir=os.path.dirname(self.path))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def try_lock(self):
+        """Non-blocking exclusive lock shared by all workers; returns an open file or None"""
+        f = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return None
+        return f
+
+    @staticmethod
+    def unlock(f):
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+
+class PriceRefresher:
+
+    def __init__(self, source, interval=120, store=None, retry_after=15):
+        self.source = source
+        self.interval = interval
+        self.store = store
+        self.retry_after = retry_after  # seconds to wait after a failed fetch before trying again
+        # Swapped as one dict so readers never mix prices and version from different refreshes;
+        # fetched_at is time.time() (comparable across workers)
+        self._state = {'version': 0, 'fetched_at': None, 'prices': {}}
+        self._store_mtime = None
+        self._failed_at = None
+        self._refresh_lock = threading.Lock()   # single-flight guard (per process)
+        self._wake = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    # ==================== READS (request path) ====================
+
+    def get(self):
+        """Last known prices; never blocks on the source. Schedules a refresh when stale."""
+        return self.snapshot()['prices']
+
+    def snapshot(self):
+        """{'version', 'fetched_at', 'prices'} - one consistent set of prices for a quote"""
+        self.start()
+        self._adopt_store()
+        state = self._state
+        if self.is_stale(state):
+            self._wake.set()
+        return state
+
+    def is_stale(self, state=None):
+        fetched_at = (state or self._state)['fetched_at']
+        return fetched_at is None or time.time() - fetched_at >= self.interval
+
+    def age(self):
+        """Seconds since the current prices were fetched (None if never refreshed)"""
+        fetched_at = self._state['fetched_at']
+        return None if fetched_at is None else time.time() - fetched_at
+
+    def _adopt_store(self):
+        """Pick up prices another worker wrote (one stat() per read; the file is re-read only when it changed)"""
+        if self.store is None:
+            return
+        mtime = self.store.mtime()
+        if mtime is None or mtime == self._store_mtime:
+            return
+        data = self.store.read()
+        if data is None:
+            return
+        self._store_mtime = mtime
+        if data.get('version', 0) > self._state['version']:
+            self._state = {'version': data['version'], 'fetched_at': data.get('fetched_at'),
+                           'prices': data['prices']}
+
+    # ==================== REFRESH ====================
+
+    def refresh_now(self):
+        """
+        Fetch from the source unless another refresh is already in flight
+        (in this process, or in another worker when a shared store is configured)
+        or another worker already refreshed the shared store.
+        Returns True if this call fetched new prices.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            if self.store is None:
+                return self._fetch(self._state['version'] + 1)
+            self._adopt_store()
+            if not self.is_stale():
+                return False
+            lock = self.store.try_lock()
+            if lock is None:
+                return False
+            try:
+                # Re-check under the lock: another worker may have just written a fresh file
+                self._store_mtime = None
+                self._adopt_store()
+                if not self.is_stale():
+                    return False
+                current = self.store.read()
+                version = max(self._state['version'], current.get('version', 0) if current else 0) + 1
+                if not self._fetch(version):
+                    return False
+                self.store.write(self._state)
+                self._store_mtime = self.store.mtime()
+                return True
+            finally:
+                self.store.unlock(lock)
+        except Exception as e:
+            print(f'[DBS2] Price refresh error: {e}')
+            return False
+        finally:
+            self._refresh_lock.release()
+
+    def _fetch(self, version):
+        # Back off after a failure so stale reads don't hammer a down upstream
+        if self._failed_at is not None and time.time() - self._failed_at < self.retry_after:
+            return False
+        try:
+            prices = self.source()
+        except Exception as e:
+            print(f'[DBS2] Price refresh error: {e}')
+            prices = None
+        if not prices:
+            self._failed_at = time.time()
+            return False
+        self._failed_at = None
+        self._state = {'version': version, 'fetched_at': time.time(), 'prices': prices}
+        return True
+
+    def start(self):
+        """Start the daemon refresher thread once per process (lazily, so it runs in each gunicorn worker)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='dbs2-price-refresher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.refresh_now()
+            # Sleep until the current prices go stale, or until a reader reports stale data
+            age = self.age()
+            timeout = self.interval if age is None else max(self.interval - age, 1)
+            if self._failed_at is not None:
+                timeout = min(timeout, self.retry_after)
+            self._wake.wait(timeout)
+            self._wake.clear()
@@ -4,7 +4,8 @@ from flask_restful import Api, Resource # used for REST API building
 from datetime import datetime, timedelta, timezone
 from __init__ import app, db
 from api.jwt_authorize import token_required
-from model.user import User
+from model.user import User, bulk_import_users
+from model.password_hasher import is_password_hash
 from model.github import GitHubUser
 
 user_api = Blueprint('user_api', __name__,
@@ -23,42 +24,58 @@ class UserAPI:
             return jsonify(current_user.read())
     
     class _BULK(Resource):  # Users API operation for Create, Read, Update, Delete 
+        @staticmethod
+        def _validate_sections(sections, uid):
+            ''' Section enrollments for one user, with years as ints; raises ValueError if malformed '''
+            if not isinstance(sections, list):
+                raise ValueError(f'Sections for user {uid} must be a list')
+            cleaned = []
+            for section in sections:
+                if not isinstance(section, dict):
+                    raise ValueError(f'Each section for user {uid} must be an object')
+                section = dict(section)
+                if 'year' in section:
+                    try:
+                        section['year'] = int(section['year'])
+                    except (TypeError, ValueError):
+                        raise ValueError(f'Section year for user {uid} must be a number')
+                cleaned.append(section)
+            return cleaned
+
         def post(self):
-            ''' Handle bulk user creation by sending POST requests to the single user endpoint '''
+            ''' Handle bulk user creation: validate the whole batch, then import it in batched transactions '''
             users = request.get_json()
             
             if not isinstance(users, list):
                 return {'message': 'Expected a list of user data'}, 400
             
             results = {'errors': []}
-            
-            with current_app.test_client() as client:
-                for user in users:
-                    # Set a default password as we don't have it for bulk creation
-                    user["password"] = app.config['DEFAULT_PASSWORD']
-                    
-                    # Simulate a POST request to the single user creation endpoint
-                    response = client.post('/api/user', json=user)
-                    
-                    if response.status_code != 200:  # Assuming success status code is 200
-                        results['errors'].append(response.get_json())
-                        continue
-                
-                    uid = user.get('uid')
-                    user_obj = User.query.filter_by(_uid=uid).first()
-                    # Process sections if provided
-                    if user_obj is not None:
-                        print("Creating:", user_obj.uid)
-                        abbreviations = [section["abbreviation"] for section in user.get('sections', [])]
-                        if len(abbreviations) > 0:  # Check if the list is not empty
-                            section_obj = user_obj.add_sections(abbreviations)
-                            if section_obj:
-                                # update the year of the added sections
-                                for section in user.get('sections'):
-                                    user_obj.update_section(section)
-                            else:
-                                results['errors'].append({'message': f'Failed to add sections {abbreviations} to user {uid}'})
-                                
+            records = []
+            seen = set()
+            for user in users:
+                if not isinstance(user, dict):
+                    results['errors'].append({'message': 'Expected an object for each user'})
+                    continue
+                # Set a default password as we don't have it for bulk creation
+                user["password"] = app.config['DEFAULT_PASSWORD']
+                try:
+                    name, uid, password = UserAPI._CRUD._validate_user_input(user)
+                    sections = UserAPI._BULK._validate_sections(user.get('sections') or [], uid)
+                except ValueError as ve:
+                    results['errors'].append({'message': str(ve)})
+                    continue
+                if uid in seen:
+                    results['errors'].append({'message': f'User ID {uid} appears more than once in the batch'})
+                    continue
+                seen.add(uid)
+                record = UserAPI._CRUD._clean_request_body(user, name, uid, password)
+                record['sections'] = sections
+                records.append(record)
+
+            created, existing, errors = bulk_import_users(records)
+            results['errors'].extend(errors)
+            results['created'] = created
+            results['existing'] = existing
             
             return jsonify(results) 
             
@@ -78,7 +95,7 @@ class UserAPI:
                 raise ValueError('User ID is missing, or is less than 2 characters')
             password = body.get('password')
             if password is not None:
-                if len(password) < 8 and not password.startswith("pbkdf2:sha256:"):
+                if len(password) < 8 and not is_password_hash(password):
                     raise ValueError('Password must be at least 8 characters')
             return name, uid, password
 
@@ -323,6 +340,8 @@ class UserAPI:
             user = User.query.filter_by(_uid=uid).first()
             if user is None or not user.is_password(password):
                 raise ValueError("Invalid user id or password")
+            # Transparent migration to the configured hash method/cost
+            user.rehash_password_if_needed(password)
             return user
 
         @staticmethod
@@ -29,8 +29,10 @@ from api.data_export_import_api import data_export_import_api
 from hacks.joke import joke_api  # Import the joke API blueprint
 from hacks.DBS2endpoint import DBS2_api  # Import the Discord Basement Simulator 2 API blueprint
 from api.post import post_api  # Import the social media post API
-from api.dbs2_api import dbs2_api
+from api.dbs2_api import dbs2_api, verify_dbs2_schema
 from model.dbs2_player import DBS2Player, initDBS2Players
+from model.ashtrail_run import migrate_ashtrail_traces_to_binary
+from model.wallet_transaction import rollup_wallet_snapshots
 #from api.announcement import announcement_api ##temporary revert
 
 # database Initialization functions
@@ -332,6 +334,21 @@ def generate_data():
         initDBS2()
         initDBS2Players()
 
+# Roll up wallet_transactions into balance snapshots (run periodically, e.g. from cron)
+@custom_cli.command('rollup_wallets')
+def rollup_wallets():
+    with app.app_context():
+        count = rollup_wallet_snapshots()
+        print(f"Wrote {count} wallet balance snapshot(s)")
+
+# Verify/upgrade the DBS2 + Ash Trail schema once at deploy time (requests then skip the check)
+@custom_cli.command('migrate_dbs2')
+def migrate_dbs2():
+    with app.app_context():
+        verify_dbs2_schema(force=True)
+        converted = migrate_ashtrail_traces_to_binary()
+        print(f"DBS2 schema verified; {converted} Ash Trail trace(s) converted to binary/LOD")
+
 # Register the custom command group with the Flask application
 app.cli.add_command(custom_cli)
         
@@ -339,5 +356,7 @@ app.cli.add_command(custom_cli)
 if __name__ == "__main__":
     host = "0.0.0.0"
     port = app.config.get('FLASK_PORT', 8403)
+    with app.app_context():
+        verify_dbs2_schema()
     print(f"** Server running: http://localhost:{port}")  # Pretty link
     app.run(debug=True, host=host, port=port, use_reloader=False)
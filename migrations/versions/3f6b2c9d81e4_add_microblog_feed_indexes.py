@@ -0,0 +1,28 @@
+"""Add composite (key, _timestamp, id) indexes for keyset-paginated microblog feeds
+
+Revision ID: 3f6b2c9d81e4
+Revises: a4e7c2f95b13
+Create Date: 2026-10-16 22:05:41.392017
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6b2c9d81e4'
+down_revision = 'a4e7c2f95b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_microblogs_timestamp_id', 'microblogs', ['_timestamp', 'id'], unique=False)
+    op.create_index('ix_microblogs_topic_timestamp_id', 'microblogs', ['_topic_id', '_timestamp', 'id'], unique=False)
+    op.create_index('ix_microblogs_user_timestamp_id', 'microblogs', ['_user_id', '_timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_microblogs_user_timestamp_id', table_name='microblogs')
+    op.drop_index('ix_microblogs_topic_timestamp_id', table_name='microblogs')
+    op.drop_index('ix_microblogs_timestamp_id', table_name='microblogs')
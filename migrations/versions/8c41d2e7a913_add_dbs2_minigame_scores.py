@@ -0,0 +1,63 @@
+"""Add dbs2_minigame_scores and backfill from dbs2_players._scores
+
+Revision ID: 8c41d2e7a913
+Revises: 5abfa8a797c5
+Create Date: 2026-10-16 10:12:04.118520
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41d2e7a913'
+down_revision = '5abfa8a797c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('dbs2_minigame_scores',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('game', sa.String(length=64), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['dbs2_players.user_id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'game', name='uq_dbs2_minigame_scores_user_game')
+    )
+    op.create_index('ix_dbs2_minigame_scores_game_score', 'dbs2_minigame_scores',
+                    ['game', sa.text('score DESC'), 'user_id'], unique=False)
+
+    # Backfill from the existing _scores JSON blobs
+    bind = op.get_bind()
+    scores_table = sa.table('dbs2_minigame_scores',
+        sa.column('user_id', sa.Integer),
+        sa.column('game', sa.String),
+        sa.column('score', sa.Float),
+    )
+    rows = []
+    for user_id, raw in bind.execute(sa.text('SELECT user_id, _scores FROM dbs2_players')):
+        try:
+            scores = json.loads(raw or '{}')
+        except ValueError:
+            continue
+        if not isinstance(scores, dict):
+            continue
+        for game, value in scores.items():
+            if isinstance(value, bool):
+                continue
+            try:
+                rows.append({'user_id': user_id, 'game': game, 'score': float(value)})
+            except (TypeError, ValueError):
+                continue
+    if rows:
+        op.bulk_insert(scores_table, rows)
+
+
+def downgrade():
+    op.drop_index('ix_dbs2_minigame_scores_game_score', table_name='dbs2_minigame_scores')
+    op.drop_table('dbs2_minigame_scores')
@@ -0,0 +1,25 @@
+"""Index ashtrail_runs (book_id, score DESC, id) for per-book leaderboards
+
+Revision ID: a4e7c2f95b13
+Revises: f3c8d1a6b270
+Create Date: 2026-10-16 14:21:36.902415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4e7c2f95b13'
+down_revision = 'f3c8d1a6b270'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_ashtrail_runs_book_score', 'ashtrail_runs',
+                    ['book_id', sa.text('score DESC'), 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ashtrail_runs_book_score', table_name='ashtrail_runs')
@@ -0,0 +1,26 @@
+"""Index dbs2_players._crypto for top-N leaderboard and admin stats
+
+Revision ID: b7e0f3c95a21
+Revises: 8c41d2e7a913
+Create Date: 2026-10-16 11:03:47.502611
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e0f3c95a21'
+down_revision = '8c41d2e7a913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('dbs2_players', schema=None) as batch_op:
+        batch_op.create_index('ix_dbs2_players__crypto', ['_crypto'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('dbs2_players', schema=None) as batch_op:
+        batch_op.drop_index('ix_dbs2_players__crypto')
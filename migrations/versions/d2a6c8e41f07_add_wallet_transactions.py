@@ -0,0 +1,78 @@
+"""Add wallet_transactions ledger and wallet_balance_snapshots
+
+Revision ID: d2a6c8e41f07
+Revises: b7e0f3c95a21
+Create Date: 2026-10-16 12:20:31.840217
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a6c8e41f07'
+down_revision = 'b7e0f3c95a21'
+branch_labels = None
+depends_on = None
+
+# Wallet coin id -> dbs2_players balance column, as of this revision
+WALLET_COLUMNS = {
+    'satoshis': '_crypto',
+    'bitcoin': '_wallet_btc',
+    'ethereum': '_wallet_eth',
+    'solana': '_wallet_sol',
+    'cardano': '_wallet_ada',
+    'dogecoin': '_wallet_doge',
+}
+
+
+def upgrade():
+    op.create_table('wallet_transactions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('coin', sa.String(length=16), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('kind', sa.String(length=32), nullable=False),
+    sa.Column('ref', sa.String(length=128), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_wallet_transactions_user_created', 'wallet_transactions',
+                    ['user_id', 'created_at', 'id'], unique=False)
+    op.create_table('wallet_balance_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('last_txn_id', sa.Integer(), nullable=False),
+    sa.Column('satoshis', sa.Float(), nullable=False),
+    sa.Column('bitcoin', sa.Float(), nullable=False),
+    sa.Column('ethereum', sa.Float(), nullable=False),
+    sa.Column('solana', sa.Float(), nullable=False),
+    sa.Column('cardano', sa.Float(), nullable=False),
+    sa.Column('dogecoin', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_wallet_balance_snapshots_user_txn', 'wallet_balance_snapshots',
+                    ['user_id', 'last_txn_id'], unique=False)
+
+    # Balances held before the ledger existed become one 'opening' transaction per coin,
+    # so ledger sums and rollup snapshots start from the real balance instead of 0
+    bind = op.get_bind()
+    created_at = datetime.utcnow()
+    for coin, column in WALLET_COLUMNS.items():
+        bind.execute(sa.text(
+            'INSERT INTO wallet_transactions (user_id, coin, amount, kind, ref, created_at) '
+            f'SELECT user_id, :coin, {column}, \'opening\', NULL, :created_at FROM dbs2_players '
+            f'WHERE {column} IS NOT NULL AND {column} != 0'
+        ), {'coin': coin, 'created_at': created_at})
+
+
+def downgrade():
+    op.drop_index('ix_wallet_balance_snapshots_user_txn', table_name='wallet_balance_snapshots')
+    op.drop_table('wallet_balance_snapshots')
+    op.drop_index('ix_wallet_transactions_user_created', table_name='wallet_transactions')
+    op.drop_table('wallet_transactions')
@@ -0,0 +1,120 @@
+"""Add ashtrail_runs._trace_bin and convert JSON traces to binary
+
+Revision ID: e5b19a3c7d42
+Revises: d2a6c8e41f07
+Create Date: 2026-10-16 13:05:47.203914
+
+"""
+from array import array
+from itertools import accumulate
+import json
+import sys
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b19a3c7d42'
+down_revision = 'd2a6c8e41f07'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of the trace encoding as of this revision (model/ashtrail_run.py may change later).
+# Binary trace: 1 header byte + int16 little-endian pairs [x0, y0, dx1, dy1, ...]
+TRACE_FORMAT_RAW = 1
+TRACE_FORMAT_ZLIB = 2
+
+
+def _encode_trace(points):
+    """[{x, y}, ...] integer grid points -> binary trace, or None if not lossless"""
+    if not isinstance(points, list):
+        return None
+    values = array('h')
+    prev_x = prev_y = 0
+    try:
+        for point in points:
+            if not isinstance(point, dict) or len(point) != 2:
+                return None
+            x, y = point['x'], point['y']
+            if type(x) is not int or type(y) is not int:
+                return None
+            values.append(x - prev_x)
+            values.append(y - prev_y)
+            prev_x, prev_y = x, y
+    except (KeyError, OverflowError):
+        return None
+    if sys.byteorder != 'little':
+        values.byteswap()
+    raw = values.tobytes()
+    packed = zlib.compress(raw, 6)
+    if len(packed) < len(raw):
+        return bytes([TRACE_FORMAT_ZLIB]) + packed
+    return bytes([TRACE_FORMAT_RAW]) + raw
+
+
+def _decode_trace(blob):
+    """Binary trace -> [{x, y}, ...]"""
+    view = memoryview(blob)
+    fmt, body = view[0], view[1:]
+    if fmt == TRACE_FORMAT_ZLIB:
+        body = zlib.decompress(body)
+    elif fmt != TRACE_FORMAT_RAW:
+        raise ValueError(f'unknown trace format {fmt}')
+    values = array('h')
+    values.frombytes(body)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return [{'x': x, 'y': y} for x, y in zip(accumulate(values[0::2]), accumulate(values[1::2]))]
+
+
+def upgrade():
+    with op.batch_alter_table('ashtrail_runs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('_trace_bin',
+                                      sa.LargeBinary().with_variant(mysql.MEDIUMBLOB(), 'mysql'),
+                                      nullable=True))
+
+    # Re-encode existing traces; rows that can't be encoded losslessly keep their JSON text
+    bind = op.get_bind()
+    runs = sa.table('ashtrail_runs',
+        sa.column('id', sa.Integer),
+        sa.column('_trace', sa.Text),
+        sa.column('_trace_bin', sa.LargeBinary),
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(runs.c.id, runs.c._trace)
+            .where(runs.c.id > last_id).order_by(runs.c.id).limit(500)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for run_id, text in rows:
+            last_id = run_id
+            try:
+                blob = _encode_trace(json.loads(text or '[]'))
+            except ValueError:
+                blob = None
+            if blob is not None:
+                updates.append({'run_id': run_id, 'blob': blob})
+        if updates:
+            bind.execute(
+                runs.update().where(runs.c.id == sa.bindparam('run_id'))
+                .values(_trace_bin=sa.bindparam('blob'), _trace='[]'),
+                updates
+            )
+
+
+def downgrade():
+    # Restore JSON text for binary rows before dropping the column
+    bind = op.get_bind()
+    rows = bind.execute(sa.text('SELECT id, _trace_bin FROM ashtrail_runs WHERE _trace_bin IS NOT NULL')).all()
+    for run_id, blob in rows:
+        bind.execute(sa.text('UPDATE ashtrail_runs SET _trace = :trace WHERE id = :id'),
+                     {'trace': json.dumps(_decode_trace(blob)), 'id': run_id})
+    with op.batch_alter_table('ashtrail_runs', schema=None) as batch_op:
+        batch_op.drop_column('_trace_bin')
@@ -0,0 +1,147 @@
+"""Add ashtrail_runs._trace_med/_trace_low simplified replay traces
+
+Revision ID: f3c8d1a6b270
+Revises: e5b19a3c7d42
+Create Date: 2026-10-16 13:48:12.507731
+
+"""
+from array import array
+from itertools import accumulate
+import sys
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8d1a6b270'
+down_revision = 'e5b19a3c7d42'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of the trace codec and level-of-detail simplification as of this revision
+# (model/ashtrail_run.py may change later).
+# Binary trace: 1 header byte + int16 little-endian pairs [x0, y0, dx1, dy1, ...]
+TRACE_FORMAT_RAW = 1
+TRACE_FORMAT_ZLIB = 2
+# Ramer-Douglas-Peucker tolerance (grid cells) per level
+TRACE_LOD_EPSILON = {'med': 0.5, 'low': 2.0}
+
+
+def _encode_trace(points):
+    """[{x, y}, ...] integer grid points -> binary trace, or None if not lossless"""
+    values = array('h')
+    prev_x = prev_y = 0
+    try:
+        for point in points:
+            x, y = point['x'], point['y']
+            if type(x) is not int or type(y) is not int:
+                return None
+            values.append(x - prev_x)
+            values.append(y - prev_y)
+            prev_x, prev_y = x, y
+    except (KeyError, OverflowError):
+        return None
+    if sys.byteorder != 'little':
+        values.byteswap()
+    raw = values.tobytes()
+    packed = zlib.compress(raw, 6)
+    if len(packed) < len(raw):
+        return bytes([TRACE_FORMAT_ZLIB]) + packed
+    return bytes([TRACE_FORMAT_RAW]) + raw
+
+
+def _decode_trace(blob):
+    """Binary trace -> [{x, y}, ...]"""
+    view = memoryview(blob)
+    fmt, body = view[0], view[1:]
+    if fmt == TRACE_FORMAT_ZLIB:
+        body = zlib.decompress(body)
+    elif fmt != TRACE_FORMAT_RAW:
+        raise ValueError(f'unknown trace format {fmt}')
+    values = array('h')
+    values.frombytes(body)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return [{'x': x, 'y': y} for x, y in zip(accumulate(values[0::2]), accumulate(values[1::2]))]
+
+
+def _simplify_trace(points, epsilon):
+    """Iterative Ramer-Douglas-Peucker: keeps the endpoints and every point farther than epsilon"""
+    n = len(points)
+    if n < 3:
+        return list(points)
+    xs = [p['x'] for p in points]
+    ys = [p['y'] for p in points]
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        x0, y0, x1, y1 = xs[start], ys[start], xs[end], ys[end]
+        dx, dy = x1 - x0, y1 - y0
+        seg_len = (dx * dx + dy * dy) ** 0.5
+        max_dist, index = -1.0, start
+        for i in range(start + 1, end):
+            if seg_len:
+                dist = abs(dy * (xs[i] - x0) - dx * (ys[i] - y0)) / seg_len
+            else:
+                dist = ((xs[i] - x0) ** 2 + (ys[i] - y0) ** 2) ** 0.5
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if max_dist > epsilon:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return [p for p, kept in zip(points, keep) if kept]
+
+
+def _trace_lods(points):
+    """(med, low) binary traces for integer grid points"""
+    return tuple(_encode_trace(_simplify_trace(points, TRACE_LOD_EPSILON[lod])) for lod in ('med', 'low'))
+
+
+def upgrade():
+    blob_type = sa.LargeBinary().with_variant(mysql.MEDIUMBLOB(), 'mysql')
+    with op.batch_alter_table('ashtrail_runs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('_trace_med', blob_type, nullable=True))
+        batch_op.add_column(sa.Column('_trace_low', blob_type, nullable=True))
+
+    # Precompute levels of detail for existing binary traces
+    bind = op.get_bind()
+    runs = sa.table('ashtrail_runs',
+        sa.column('id', sa.Integer),
+        sa.column('_trace_bin', sa.LargeBinary),
+        sa.column('_trace_med', sa.LargeBinary),
+        sa.column('_trace_low', sa.LargeBinary),
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(runs.c.id, runs.c._trace_bin)
+            .where(runs.c.id > last_id, runs.c._trace_bin.isnot(None))
+            .order_by(runs.c.id).limit(500)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for run_id, blob in rows:
+            last_id = run_id
+            med, low = _trace_lods(_decode_trace(blob))
+            updates.append({'run_id': run_id, 'med': med, 'low': low})
+        bind.execute(
+            runs.update().where(runs.c.id == sa.bindparam('run_id'))
+            .values(_trace_med=sa.bindparam('med'), _trace_low=sa.bindparam('low')),
+            updates
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('ashtrail_runs', schema=None) as batch_op:
+        batch_op.drop_column('_trace_low')
+        batch_op.drop_column('_trace_med')
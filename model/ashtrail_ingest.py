@@ -0,0 +1,119 @@
+"""
+Ash Trail run ingestion - batched inserts for POST /api/dbs2/ash-trail/runs
+
+During class sessions many guests submit runs at once, and one INSERT + COMMIT per
+run serializes them on SQLite's write lock. Runs are instead written in batches:
+- insert_runs() writes a list of runs with one multi-row INSERT in one transaction
+  (used directly by the batch endpoint)
+- RunIngestBuffer groups concurrent single submissions: the first submitter waits
+  up to DBS2_ASHTRAIL_BATCH_WAIT_MS for others to join (or until the batch holds
+  DBS2_ASHTRAIL_BATCH_SIZE runs), then writes the whole batch and hands every
+  waiting submitter its own result. Responses still carry the new run id.
+  Batching is opt-in (DBS2_ASHTRAIL_BATCH_WAIT_MS defaults to 0). If the batch
+  INSERT fails, its runs are retried one at a time so a bad run only fails its
+  own submission.
+"""
+import threading
+
+from __init__ import app, db
+from model.ashtrail_run import AshTrailRun
+
+
+def new_run(user_id, book_id, score, trace, guest_name=None):
+    """Transient AshTrailRun with its trace encoded (binary + levels of detail)"""
+    run = AshTrailRun(user_id=user_id, book_id=book_id, score=score, guest_name=guest_name)
+    run.trace = trace
+    return run
+
+
+def insert_runs(runs):
+    """
+    Write runs in one transaction and return their read() payloads (without traces).
+    The flush sends one multi-row INSERT where the database supports it.
+    """
+    if not runs:
+        return []
+    try:
+        db.session.add_all(runs)
+        db.session.flush()
+        # Build payloads before commit so committing doesn't expire and reload every run
+        payloads = [run.read(include_trace=False) for run in runs]
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return payloads
+
+
+class _Batch:
+    def __init__(self):
+        self.runs = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = None  # per run: (payload, error)
+
+
+class RunIngestBuffer:
+    """Group commit for single run submissions (thread-safe; one buffer per process)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._batch = None
+
+    def submit(self, run):
+        """Queue a transient run, wait for its batch to be written, return its payload"""
+        wait_ms = app.config.get('DBS2_ASHTRAIL_BATCH_WAIT_MS', 0)
+        if wait_ms <= 0:
+            return insert_runs([run])[0]
+        max_size = app.config.get('DBS2_ASHTRAIL_BATCH_SIZE', 100)
+
+        with self._lock:
+            batch = self._batch
+            leader = batch is None
+            if leader:
+                batch = self._batch = _Batch()
+            index = len(batch.runs)
+            batch.runs.append(run)
+            if len(batch.runs) >= max_size:
+                # Seal the batch; the next submitter starts a new one
+                self._batch = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(wait_ms / 1000.0)
+            with self._lock:
+                if self._batch is batch:
+                    self._batch = None
+            # The leader writes the batch on its own request's session
+            try:
+                batch.results = _write_batch(batch.runs)
+            finally:
+                batch.done.set()
+        elif not batch.done.wait(30):
+            raise RuntimeError('Ash Trail run batch was not written in time')
+
+        payload, error = batch.results[index]
+        if error is not None:
+            raise error
+        return payload
+
+
+def _write_batch(runs):
+    """insert_runs() for the whole batch; on failure, each run alone so errors stay per run"""
+    try:
+        return [(payload, None) for payload in insert_runs(runs)]
+    except Exception as e:
+        if len(runs) == 1:
+            return [(None, e)]
+    results = []
+    for run in runs:
+        # The rolled-back flush may have left the generated primary key behind
+        run.id = None
+        try:
+            results.append((insert_runs([run])[0], None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+
+run_ingest_buffer = RunIngestBuffer()
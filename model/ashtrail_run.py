@@ -1,15 +1,141 @@
+from array import array
 from datetime import datetime
+from itertools import accumulate
 import json
+import sys
+import zlib
+
+from sqlalchemy import func
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import deferred, joinedload
 
 from __init__ import db
 
 
+# ==================== TRACE ENCODING ====================
+# Binary trace: 1 header byte + int16 little-endian pairs [x0, y0, dx1, dy1, ...]
+# (first point absolute, then deltas between consecutive points; grid steps are small,
+# so deltas are tiny and zlib-compress well).
+TRACE_FORMAT_RAW = 1
+TRACE_FORMAT_ZLIB = 2
+# Column type for binary traces: MEDIUMBLOB (up to 16 MB) on MySQL, where a plain BLOB caps at 64 KB
+TRACE_BLOB = db.LargeBinary().with_variant(mysql.MEDIUMBLOB(), 'mysql')
+
+
+def encode_trace(points):
+    """
+    Encode [{x, y}, ...] integer grid points as a compact binary trace.
+    Returns None when the trace can't be stored losslessly (non-integer or extra keys,
+    values outside int16) - callers then keep the JSON text encoding.
+    """
+    if not isinstance(points, list):
+        return None
+    values = array('h')
+    prev_x = prev_y = 0
+    try:
+        for point in points:
+            if not isinstance(point, dict) or len(point) != 2:
+                return None
+            x, y = point['x'], point['y']
+            if type(x) is not int or type(y) is not int:
+                return None
+            values.append(x - prev_x)
+            values.append(y - prev_y)
+            prev_x, prev_y = x, y
+    except (KeyError, OverflowError):
+        return None
+    if sys.byteorder != 'little':
+        values.byteswap()
+    raw = values.tobytes()
+    packed = zlib.compress(raw, 6)
+    if len(packed) < len(raw):
+        return bytes([TRACE_FORMAT_ZLIB]) + packed
+    return bytes([TRACE_FORMAT_RAW]) + raw
+
+
+def _trace_values(blob):
+    """Binary trace -> int16 array [x0, y0, dx1, dy1, ...]"""
+    view = memoryview(blob)
+    fmt, body = view[0], view[1:]
+    if fmt == TRACE_FORMAT_ZLIB:
+        body = zlib.decompress(body)
+    elif fmt != TRACE_FORMAT_RAW:
+        raise ValueError(f'unknown trace format {fmt}')
+    values = array('h')
+    values.frombytes(body)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def decode_trace(blob):
+    """Binary trace -> [{x, y}, ...]"""
+    values = _trace_values(blob)
+    return [{'x': x, 'y': y} for x, y in zip(accumulate(values[0::2]), accumulate(values[1::2]))]
+
+
+def decode_trace_json(blob):
+    """Binary trace -> JSON text, without building intermediate dicts"""
+    values = _trace_values(blob)
+    return '[' + ','.join(
+        '{"x":%d,"y":%d}' % xy for xy in zip(accumulate(values[0::2]), accumulate(values[1::2]))
+    ) + ']'
+
+
+# ==================== LEVEL OF DETAIL ====================
+# Ramer-Douglas-Peucker tolerance (grid cells) per level; 'full' is the stored trace
+TRACE_LOD_EPSILON = {'med': 0.5, 'low': 2.0}
+TRACE_LODS = ('low', 'med', 'full')
+
+
+def simplify_trace(points, epsilon):
+    """
+    Ramer-Douglas-Peucker simplification of [{x, y}, ...]; keeps the endpoints and every
+    point farther than epsilon from the simplified line. Iterative (long runs would
+    exceed the recursion limit).
+    """
+    n = len(points)
+    if n < 3:
+        return list(points)
+    xs = [p['x'] for p in points]
+    ys = [p['y'] for p in points]
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        x0, y0, x1, y1 = xs[start], ys[start], xs[end], ys[end]
+        dx, dy = x1 - x0, y1 - y0
+        seg_len = (dx * dx + dy * dy) ** 0.5
+        max_dist, index = -1.0, start
+        for i in range(start + 1, end):
+            if seg_len:
+                # Perpendicular distance to the chord
+                dist = abs(dy * (xs[i] - x0) - dx * (ys[i] - y0)) / seg_len
+            else:
+                # Closed loop: distance to the shared endpoint
+                dist = ((xs[i] - x0) ** 2 + (ys[i] - y0) ** 2) ** 0.5
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if max_dist > epsilon:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return [p for p, kept in zip(points, keep) if kept]
+
+
 class AshTrailRun(db.Model):
     """
     Stores a single Ash Trail run (ghost replay) for a specific book.
 
     book_id: one of 'defi_grimoire' | 'lost_ledger' | 'proof_of_burn'
-    trace: list of points in grid space [{x, y}, ...] serialized as JSON text
+    trace: list of points in grid space [{x, y}, ...]; stored in _trace_bin as delta-encoded
+           int16 pairs (see encode_trace), or as JSON text in _trace when a trace can't be
+           encoded losslessly (and for rows written before binary traces)
+    _trace_low/_trace_med: RDP-simplified binary traces computed when the trace is set
+           (NULL for JSON-only traces and old rows; those serve the full trace)
     """
 
     __tablename__ = 'ashtrail_runs'
@@ -18,22 +144,62 @@ class AshTrailRun(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     book_id = db.Column(db.String(64), nullable=False, index=True)
     score = db.Column(db.Float, nullable=False, default=0)
-    _trace = db.Column(db.Text, nullable=False, default='[]')
+    # Trace columns are deferred so run lists don't load them; detail reads undefer only
+    # the group for the requested level of detail (see trace_group())
+    _trace = deferred(db.Column(db.Text, nullable=False, default='[]'), group='trace')
+    _trace_bin = deferred(db.Column(TRACE_BLOB, nullable=True), group='trace')
+    _trace_med = deferred(db.Column(TRACE_BLOB, nullable=True), group='trace_med')
+    _trace_low = deferred(db.Column(TRACE_BLOB, nullable=True), group='trace_low')
     guest_name = db.Column(db.String(128), nullable=True)  # Display name when run is from unauthenticated guest
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     user = db.relationship('User', backref=db.backref('ashtrail_runs', lazy=True))
 
+    __table_args__ = (
+        # Per-book leaderboards: WHERE book_id = ? ORDER BY score DESC LIMIT n reads the index in order
+        db.Index('ix_ashtrail_runs_book_score', 'book_id', score.desc(), 'id'),
+    )
+
     @property
     def trace(self):
         try:
+            if self._trace_bin:
+                return decode_trace(self._trace_bin)
             return json.loads(self._trace)
         except Exception:
             return []
 
     @trace.setter
     def trace(self, points):
-        self._trace = json.dumps(points) if isinstance(points, list) else '[]'
+        blob = encode_trace(points)
+        if blob is not None:
+            self._trace_bin = blob
+            self._trace = '[]'
+            self._trace_med, self._trace_low = trace_lods(points)
+        else:
+            self._trace_bin = self._trace_med = self._trace_low = None
+            self._trace = json.dumps(points) if isinstance(points, list) else '[]'
+
+    @staticmethod
+    def trace_group(lod):
+        return 'trace' if lod == 'full' else 'trace_' + lod
+
+    def trace_json(self, lod='full'):
+        """
+        Trace (at the given level of detail) as JSON text, straight from storage
+        (no parse/re-serialize round trip). Falls back to the full trace when the
+        simplified one wasn't stored.
+        """
+        try:
+            if lod != 'full':
+                blob = self._trace_low if lod == 'low' else self._trace_med
+                if blob:
+                    return decode_trace_json(blob)
+            if self._trace_bin:
+                return decode_trace_json(self._trace_bin)
+        except Exception:
+            return '[]'
+        return self._trace or '[]'
 
     def read(self, include_trace=False):
         user_info = {}
@@ -54,4 +220,122 @@ class AshTrailRun(db.Model):
             payload['trace'] = self.trace
         return payload
 
+    def read_json(self, lod='full'):
+        """JSON text of {'run': read(include_trace=True)} with the trace spliced in as stored"""
+        run = self.read(include_trace=False)
+        run['lod'] = lod
+        payload = json.dumps({'run': run})
+        # payload ends with '}}'; insert the trace before the closing braces
+        return payload[:-2] + ', "trace": ' + self.trace_json(lod) + '}}'
+
+    # ==================== LEADERBOARD QUERIES ====================
+
+    @staticmethod
+    def query_with_user():
+        """Runs with their user joined in the same query (User's own eager relationships skipped)"""
+        return AshTrailRun.query.options(joinedload(AshTrailRun.user).lazyload('*'))
+
+    @staticmethod
+    def _book_top_ids(book_id, limit, best_per_user=False):
+        """
+        Select of the ids of one book's top `limit` runs. The plain case is
+        WHERE book_id = ? ORDER BY score DESC, id LIMIT n, read in order off
+        ix_ashtrail_runs_book_score. best_per_user keeps only each player's best run;
+        guest runs share one user id, so guests are told apart by guest_name.
+        """
+        if not best_per_user:
+            top = (db.select(AshTrailRun.id).where(AshTrailRun.book_id == book_id)
+                   .order_by(AshTrailRun.score.desc(), AshTrailRun.id).limit(limit))
+        else:
+            per_user = db.select(AshTrailRun.id, AshTrailRun.score, func.row_number().over(
+                partition_by=(AshTrailRun.user_id, func.coalesce(AshTrailRun.guest_name, '')),
+                order_by=(AshTrailRun.score.desc(), AshTrailRun.id)
+            ).label('user_rank')).where(AshTrailRun.book_id == book_id).subquery()
+            top = (db.select(per_user.c.id).where(per_user.c.user_rank == 1)
+                   .order_by(per_user.c.score.desc(), per_user.c.id).limit(limit))
+        # Wrapped so the ORDER BY / LIMIT stays valid inside a UNION ALL (SQLite)
+        top = top.subquery()
+        return db.select(top.c.id)
 
+    @staticmethod
+    def _ranked_ids(limit, book_id=None, best_per_user=False):
+        """
+        UNION ALL of the per-book top-`limit` id queries (one book, or every book),
+        or None when there are no runs.
+        """
+        if book_id:
+            books = [book_id]
+        else:
+            books = db.session.execute(db.select(AshTrailRun.book_id).distinct()).scalars().all()
+        if not books:
+            return None
+        return db.union_all(*(AshTrailRun._book_top_ids(book, limit, best_per_user) for book in books))
+
+    @staticmethod
+    def get_top_runs(book_id=None, limit=10, best_per_user=False):
+        """Top runs (one book, or across all books), users eager-loaded"""
+        query = AshTrailRun.query_with_user()
+        if best_per_user:
+            ranked = AshTrailRun._ranked_ids(limit, book_id, True)
+            if ranked is None:
+                return []
+            query = query.filter(AshTrailRun.id.in_(ranked))
+        elif book_id:
+            query = query.filter(AshTrailRun.book_id == book_id)
+        return query.order_by(AshTrailRun.score.desc(), AshTrailRun.id).limit(limit).all()
+
+    @staticmethod
+    def get_top_runs_by_book(limit=5, best_per_user=False):
+        """{book_id: [top runs]} for every book: one DISTINCT book lookup, then one UNION ALL query"""
+        ranked = AshTrailRun._ranked_ids(limit, best_per_user=best_per_user)
+        if ranked is None:
+            return {}
+        runs = (AshTrailRun.query_with_user()
+                .filter(AshTrailRun.id.in_(ranked))
+                .order_by(AshTrailRun.book_id, AshTrailRun.score.desc(), AshTrailRun.id)
+                .all())
+        boards = {}
+        for run in runs:
+            boards.setdefault(run.book_id, []).append(run)
+        return boards
+
+
+def trace_lods(points):
+    """(med, low) binary traces for integer grid points (None where encoding fails)"""
+    return tuple(encode_trace(simplify_trace(points, TRACE_LOD_EPSILON[lod])) for lod in ('med', 'low'))
+
+
+def migrate_ashtrail_traces_to_binary(batch_size=500):
+    """
+    Re-encode JSON text traces as binary traces and fill in missing low/med levels of
+    detail (rows whose trace can't be encoded losslessly stay as JSON).
+    Returns the number of rows converted.
+    """
+    converted = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(AshTrailRun.id, AshTrailRun._trace, AshTrailRun._trace_bin)
+            .where(AshTrailRun.id > last_id,
+                   AshTrailRun._trace_bin.is_(None) | AshTrailRun._trace_low.is_(None))
+            .order_by(AshTrailRun.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for run_id, text, blob in rows:
+            last_id = run_id
+            try:
+                points = decode_trace(blob) if blob else json.loads(text or '[]')
+                blob = blob or encode_trace(points)
+            except (ValueError, zlib.error):
+                blob = None
+            if blob is not None:
+                med, low = trace_lods(points)
+                updates.append({'id': run_id, '_trace_bin': blob, '_trace': '[]',
+                                '_trace_med': med, '_trace_low': low})
+        if updates:
+            db.session.execute(db.update(AshTrailRun), updates)
+            db.session.commit()
+            converted += len(updates)
+    return converted
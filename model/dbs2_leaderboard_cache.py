@@ -0,0 +1,248 @@
+"""
+DBS2 Leaderboard Cache - in-process top-K boards for /api/dbs2/leaderboard*
+
+One board per ranking: 'crypto' (DBS2Player._crypto) and 'game:<name>' for each
+minigame score. Each board keeps the top CAPACITY entries in a bisect-maintained
+list of (-score, user_id) keys plus a user_id -> entry dict, so warm reads never
+touch the database.
+
+Write-through: session events snapshot every DBS2Player flushed (or changed by
+the credit()/debit() ledger UPDATEs) in a transaction and apply the changes to
+the loaded boards once the transaction commits, and hand the same changes to
+leaderboard_publisher for the socket server's live boards. Bulk SQL updates bypass
+the ORM, so those callers must call invalidate(). Each board
+also expires after DBS2_LEADERBOARD_TTL seconds so that, with several gunicorn
+workers, writes handled by another worker show up within the TTL.
+"""
+import bisect
+import threading
+import time
+
+from sqlalchemy import event
+
+from __init__ import app, db
+from model.dbs2_player import DBS2Player, DBS2MinigameScore
+from model.dbs2_leaderboard_publisher import leaderboard_publisher
+
+
+CAPACITY = 100  # matches the max ?limit= accepted by the leaderboard endpoints
+
+
+def crypto_entry(player):
+    """Leaderboard entry for the satoshi board (player.read() + minigames_completed)"""
+    entry = player.read()
+    entry['minigames_completed'] = {
+        'crypto_miner': entry.get('completed_crypto_miner', False),
+        'infinite_user': entry.get('completed_infinite_user', False),
+        'laundry': entry.get('completed_laundry', False),
+        'ash_trail': entry.get('completed_ash_trail', False),
+        'whackarat': entry.get('completed_whackarat', False)
+    }
+    return entry
+
+
+class _Board:
+    """Top-K window for one ranking. Not thread-safe; LeaderboardCache holds the lock."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.keys = []       # sorted (-score, user_id)
+        self.entries = {}    # user_id -> (key, entry)
+        self.complete = False  # True when the window holds every ranked player
+        self.loaded_at = None
+
+    def load(self, rows):
+        """rows: iterable of (user_id, score, entry) already ordered by score desc"""
+        self.keys = []
+        self.entries = {}
+        for user_id, score, entry in rows:
+            key = (-score, user_id)
+            self.keys.append(key)
+            self.entries[user_id] = (key, entry)
+        self.keys.sort()
+        self.complete = len(self.keys) < self.capacity
+        self.loaded_at = time.monotonic()
+
+    def is_fresh(self, ttl):
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < ttl
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def _remove(self, user_id):
+        key, _ = self.entries.pop(user_id)
+        i = bisect.bisect_left(self.keys, key)
+        del self.keys[i]
+
+    def apply(self, user_id, score, entry):
+        """Move user_id to its new position, or drop the window if it can't be kept exact."""
+        if self.loaded_at is None:
+            return
+        removed = user_id in self.entries
+        if removed:
+            self._remove(user_id)
+        key = (-score, user_id)
+        if self.complete or (self.keys and key < self.keys[-1]):
+            bisect.insort(self.keys, key)
+            self.entries[user_id] = (key, entry)
+            if len(self.keys) > self.capacity:
+                dropped = self.keys.pop()
+                del self.entries[dropped[1]]
+                self.complete = False
+        elif removed:
+            # Fell below the window; an uncached player may now belong in it
+            self.invalidate()
+
+    def discard(self, user_id):
+        if self.loaded_at is None or user_id not in self.entries:
+            return
+        self._remove(user_id)
+        if not self.complete:
+            self.invalidate()
+
+    def top(self, limit):
+        result = []
+        for rank, key in enumerate(self.keys[:limit], start=1):
+            entry = dict(self.entries[key[1]][1])
+            entry['rank'] = rank
+            result.append(entry)
+        return result
+
+
+class LeaderboardCache:
+    """Process-wide registry of leaderboard boards."""
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self._boards = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return app.config.get('DBS2_LEADERBOARD_TTL', 15)
+
+    def _board(self, name):
+        board = self._boards.get(name)
+        if board is None:
+            board = self._boards[name] = _Board(self.capacity)
+        return board
+
+    def _read(self, name, limit, loader):
+        with self._lock:
+            board = self._board(name)
+            if board.is_fresh(self.ttl):
+                return board.top(limit)
+        rows = loader(self.capacity)
+        with self._lock:
+            board = self._board(name)
+            board.load(rows)
+            return board.top(limit)
+
+    def crypto_top(self, limit=10):
+        """Top players by satoshis, same shape as DBS2Player.get_leaderboard() + minigames_completed"""
+        def loader(capacity):
+            players = (DBS2Player.query_with_user()
+                       .order_by(DBS2Player._crypto.desc(), DBS2Player.user_id)
+                       .limit(capacity).all())
+            return [(p.user_id, p._crypto or 0, crypto_entry(p)) for p in players]
+        return self._read('crypto', limit, loader)
+
+    def minigame_top(self, game, limit=10):
+        """Top scores for one minigame, same shape as DBS2MinigameScore.get_leaderboard()"""
+        def loader(capacity):
+            return [(user_id, score, {'user_info': {'id': user_id, 'uid': uid, 'name': name}, 'score': score, 'game': game})
+                    for user_id, score, uid, name in DBS2MinigameScore.top_rows(game, capacity)]
+        return self._read('game:' + game, limit, loader)
+
+    def apply_player(self, user_id, crypto, crypto_data, scores, user_info):
+        """Write-through for one committed DBS2Player snapshot"""
+        with self._lock:
+            self._board('crypto').apply(user_id, crypto, crypto_data)
+            for name, board in self._boards.items():
+                if not name.startswith('game:'):
+                    continue
+                game = name[len('game:'):]
+                score = DBS2MinigameScore.coerce_score(scores.get(game))
+                if score is None:
+                    board.discard(user_id)
+                else:
+                    board.apply(user_id, score, {'user_info': dict(user_info, id=user_id), 'score': score, 'game': game})
+
+    def remove_player(self, user_id):
+        with self._lock:
+            for board in self._boards.values():
+                board.discard(user_id)
+
+    def invalidate(self, name=None):
+        """Drop one board (or all boards) so the next read reloads from the database"""
+        with self._lock:
+            boards = [self._boards[name]] if name in self._boards else (
+                [] if name else list(self._boards.values()))
+            for board in boards:
+                board.invalidate()
+        if not name:
+            leaderboard_publisher.publish_reset()
+
+
+leaderboard_cache = LeaderboardCache()
+
+
+# ==================== WRITE-THROUGH SESSION HOOKS ====================
+
+def _snapshot(player):
+    entry = crypto_entry(player)
+    return {
+        'user_id': player.user_id,
+        'crypto': entry.get('crypto') or 0,
+        'crypto_data': entry,
+        'scores': entry.get('scores') or {},
+        'user_info': {'uid': entry['user_info'].get('uid'), 'name': entry['user_info'].get('name')}
+    }
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_player_changes(session, flush_context):
+    pending = session.info.setdefault('dbs2_leaderboard_pending', {})
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, DBS2Player):
+            try:
+                pending[obj.user_id] = _snapshot(obj)
+            except Exception:
+                pending[obj.user_id] = None  # unknown state; drop from boards
+    for obj in session.deleted:
+        if isinstance(obj, DBS2Player):
+            pending[obj.user_id] = None
+
+
+@event.listens_for(db.session, 'before_commit')
+def _collect_ledger_changes(session):
+    # Players changed by DBS2Player.credit()/debit() UPDATE statements are never "dirty"
+    touched = session.info.pop('dbs2_players_touched', None)
+    if not touched:
+        return
+    pending = session.info.setdefault('dbs2_leaderboard_pending', {})
+    for player in touched:
+        try:
+            pending[player.user_id] = _snapshot(player)
+        except Exception:
+            pending[player.user_id] = None
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_player_changes(session):
+    pending = session.info.pop('dbs2_leaderboard_pending', None)
+    if not pending:
+        return
+    for user_id, snap in pending.items():
+        if snap is None:
+            leaderboard_cache.remove_player(user_id)
+            leaderboard_publisher.publish_removed(user_id)
+        else:
+            leaderboard_cache.apply_player(**snap)
+            leaderboard_publisher.publish_player(**snap)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_player_changes(session, previous_transaction):
+    session.info.pop('dbs2_leaderboard_pending', None)
+    session.info.pop('dbs2_players_touched', None)
@@ -0,0 +1,101 @@
+"""
+DBS2 Leaderboard Publisher - pushes committed score / wallet changes to the socket server
+
+The write-through hooks in dbs2_leaderboard_cache hand every committed DBS2Player
+snapshot to publish_player(). Changes are coalesced per user in memory and a daemon
+thread POSTs them every DBS2_LEADERBOARD_PUSH_INTERVAL_MS to DBS2_LEADERBOARD_PUSH_URL
+(socket/socket_server.py), which keeps the live boards and pushes rank diffs to
+subscribed clients. Publishing never blocks or fails a request; when the URL is unset
+it is a no-op.
+
+Delta shape (one per user):
+    {'user_id': 7, 'uid': 'jdoe', 'name': 'J Doe', 'boards': {'crypto': 1200, 'game:ash_trail': 88.0}}
+    {'user_id': 7, 'removed': True}
+A batch with 'reset': True tells the socket server to reload its boards from
+/api/dbs2/leaderboard* (after bulk SQL updates, or when an earlier push was lost).
+"""
+import threading
+import time
+
+import requests
+
+from __init__ import app
+from model.dbs2_player import DBS2MinigameScore
+
+
+class LeaderboardPublisher:
+
+    def __init__(self, retry_after=5):
+        self.retry_after = retry_after  # seconds between attempts while the socket server is unreachable
+        self._pending = {}  # user_id -> latest delta
+        self._reset = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def url(self):
+        return app.config.get('DBS2_LEADERBOARD_PUSH_URL')
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='dbs2-leaderboard-publisher', daemon=True)
+            self._thread.start()
+
+    def _enqueue(self, user_id=None, delta=None, reset=False):
+        if not self.url:
+            return
+        with self._lock:
+            if reset:
+                self._reset = True
+                self._pending.clear()  # the reload supersedes them
+            elif user_id is not None:
+                self._pending[user_id] = delta
+            self._start()
+        self._wake.set()
+
+    def publish_player(self, user_id, crypto, scores, user_info, **_):
+        """Queue one committed player snapshot (crypto board + every minigame board)"""
+        boards = {'crypto': crypto or 0}
+        for game, value in (scores or {}).items():
+            boards['game:' + game] = DBS2MinigameScore.coerce_score(value)
+        self._enqueue(user_id, {'user_id': user_id, 'uid': user_info.get('uid'),
+                                'name': user_info.get('name'), 'boards': boards})
+
+    def publish_removed(self, user_id):
+        self._enqueue(user_id, {'user_id': user_id, 'removed': True})
+
+    def publish_reset(self):
+        self._enqueue(reset=True)
+
+    def _take(self):
+        with self._lock:
+            self._wake.clear()
+            batch = {'reset': self._reset, 'deltas': list(self._pending.values())}
+            self._pending = {}
+            self._reset = False
+        return batch
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            # Coalesce bursts: changes to the same user within the interval are sent once
+            time.sleep(app.config.get('DBS2_LEADERBOARD_PUSH_INTERVAL_MS', 100) / 1000)
+            batch = self._take()
+            if not batch['reset'] and not batch['deltas']:
+                continue
+            headers = {}
+            token = app.config.get('DBS2_LEADERBOARD_PUSH_TOKEN')
+            if token:
+                headers['X-Leaderboard-Token'] = token
+            try:
+                response = requests.post(self.url, json=batch, headers=headers, timeout=2)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                print('[DBS2] Leaderboard push failed:', e)
+                # The socket server missed these deltas; have it reload once it is reachable
+                time.sleep(self.retry_after)
+                self._enqueue(reset=True)
+
+
+leaderboard_publisher = LeaderboardPublisher()
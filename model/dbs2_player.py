@@ -12,8 +12,28 @@ ALTER TABLE dbs2_players ADD COLUMN _scrap_infinite_user BOOLEAN DEFAULT FALSE;
 
 from __init__ import app, db
 from model.user import User
+from model.wallet_transaction import WalletTransaction, record_transaction, record_transactions_from_select, bulk_ref
+from sqlalchemy import case, event, func, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import attributes, joinedload, lazyload
 import json
 from datetime import datetime
+
+
+# Rows per UPDATE statement for admin bulk actions; large tables are updated in id-range chunks
+BULK_UPDATE_CHUNK_SIZE = 5000
+
+# Wallet coin id -> balance column
+WALLET_FIELDS = {
+    'satoshis': '_crypto',
+    'bitcoin': '_wallet_btc',
+    'ethereum': '_wallet_eth',
+    'solana': '_wallet_sol',
+    'cardano': '_wallet_ada',
+    'dogecoin': '_wallet_doge'
+}
+
+
 class DBS2Player(db.Model):
     
     """
@@ -24,6 +44,9 @@ class DBS2Player(db.Model):
     - _crypto for main satoshi balance
     - Multi-coin wallet balances (BTC, ETH, SOL, ADA, DOGE)
     - JSON fields for inventory and scores
+    
+    Mutators (add_to_wallet, update_score, update, ...) only stage changes on the
+    session; the caller commits once per request (see dbs2_api's unit of work).
     """
     __tablename__ = 'dbs2_players'
     
@@ -33,8 +56,8 @@ class DBS2Player(db.Model):
     # Foreign key to User
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False)
     
-    # Main currency (satoshis)
-    _crypto = db.Column(db.Integer, default=0)
+    # Main currency (satoshis) - indexed for leaderboard / top-N queries
+    _crypto = db.Column(db.Integer, default=0, index=True)
     
     equipped_character = db.Column(
             db.String(100),
@@ -78,6 +101,10 @@ class DBS2Player(db.Model):
     # Relationship to User
     user = db.relationship('User', backref=db.backref('dbs2_player', uselist=False, lazy=True))
     
+    # Normalized per-game best scores (mirror of _scores, indexed for leaderboards)
+    minigame_scores = db.relationship('DBS2MinigameScore', backref='player', lazy=True,
+                                      cascade='all, delete-orphan')
+    
     def __init__(self, user_id):
         self.user_id = user_id
         self._crypto = 0
@@ -120,19 +147,10 @@ class DBS2Player(db.Model):
     
     def add_to_wallet(self, coin_id, amount):
         """Add amount to a specific coin balance"""
-        field_map = {
-            'satoshis': '_crypto',
-            'bitcoin': '_wallet_btc',
-            'ethereum': '_wallet_eth',
-            'solana': '_wallet_sol',
-            'cardano': '_wallet_ada',
-            'dogecoin': '_wallet_doge'
-        }
-        
-        if coin_id not in field_map:
+        if coin_id not in WALLET_FIELDS:
             return False
         
-        field = field_map[coin_id]
+        field = WALLET_FIELDS[coin_id]
         current = getattr(self, field, 0) or 0
         
         if coin_id == 'satoshis':
@@ -140,9 +158,58 @@ class DBS2Player(db.Model):
         else:
             setattr(self, field, max(0.0, float(current + amount)))
         
-        db.session.commit()
         return True
     
+    # ==================== WALLET LEDGER (atomic) ====================
+    
+    def _ledger_update(self, coin_id, amount, debit, set_flag=None):
+        """
+        Single conditional UPDATE on this player's balance row. The balance arithmetic and the
+        sufficiency check run inside the database, so concurrent requests from other workers
+        can't lose updates and no row lock / retry loop is needed. Returns True if applied.
+        """
+        field = WALLET_FIELDS.get(coin_id)
+        if field is None:
+            return False
+        amount = int(amount) if coin_id == 'satoshis' else float(amount)
+        if amount < 0 or (debit and amount == 0 and not set_flag):
+            return False
+        column = getattr(DBS2Player, field)
+        balance = func.coalesce(column, 0)
+        values = {column: balance - amount if debit else balance + amount}
+        stmt = update(DBS2Player).where(DBS2Player.id == self.id)
+        if debit:
+            stmt = stmt.where(balance >= amount)
+        if set_flag:
+            flag = getattr(DBS2Player, set_flag)
+            stmt = stmt.where(func.coalesce(flag, False) == False)
+            values[flag] = True
+        result = db.session.execute(
+            stmt.values(values).execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            return False
+        record_transaction(self.user_id, coin_id, -amount if debit else amount,
+                           kind='debit' if debit else 'credit')
+        # Reload the changed columns on next access and let the leaderboard cache see the write
+        db.session.expire(self, [field, set_flag] if set_flag else [field])
+        db.session.info.setdefault('dbs2_players_touched', set()).add(self)
+        return True
+    
+    def credit(self, coin_id, amount):
+        """Atomically add a non-negative amount to a coin balance (staged; no commit)"""
+        return self._ledger_update(coin_id, amount, debit=False)
+    
+    def debit(self, coin_id, amount, set_flag=None):
+        """
+        Atomically subtract amount from a coin balance only if the balance covers it:
+        UPDATE ... SET bal = bal - :x WHERE id = :id AND bal >= :x. Returns False (and changes
+        nothing) on insufficient funds. set_flag names a boolean column (e.g. '_scrap_laundry')
+        set to True in the same statement; the debit then also requires it to be unset, so a
+        one-time purchase can't be bought twice concurrently.
+        """
+        return self._ledger_update(coin_id, amount, debit=True, set_flag=set_flag)
+    
     # ==================== SCRAP OWNERSHIP ====================
     
     @property
@@ -194,7 +261,6 @@ class DBS2Player(db.Model):
         field = field_map.get(scrap_id)
         if field:
             setattr(self, field, bool(owned))
-            db.session.commit()
             return True
         return False
     
@@ -215,14 +281,12 @@ class DBS2Player(db.Model):
             self._inventory = json.dumps(value)
         else:
             self._inventory = '[]'
-        db.session.commit()
     
     def add_inventory_item(self, item):
         """Add item to inventory"""
         inv = self.inventory
         inv.append(item)
         self._inventory = json.dumps(inv)
-        db.session.commit()
         return inv
     
     def remove_inventory_item(self, index):
@@ -231,7 +295,6 @@ class DBS2Player(db.Model):
         if 0 <= index < len(inv):
             removed = inv.pop(index)
             self._inventory = json.dumps(inv)
-            db.session.commit()
             return removed
         return None
     
@@ -252,7 +315,7 @@ class DBS2Player(db.Model):
             self._scores = json.dumps(value)
         else:
             self._scores = '{}'
-        db.session.commit()
+        self.sync_minigame_scores()
     
     def update_score(self, game, score):
         """Update score for a game (keeps highest)"""
@@ -260,9 +323,31 @@ class DBS2Player(db.Model):
         if game not in current_scores or score > current_scores[game]:
             current_scores[game] = score
             self._scores = json.dumps(current_scores)
-            db.session.commit()
+            DBS2MinigameScore.upsert(self.user_id, game, score)
         return current_scores
     
+    def sync_minigame_scores(self):
+        """Rewrite this player's dbs2_minigame_scores rows from the _scores JSON (no commit)"""
+        try:
+            scores = json.loads(self._scores or '{}')
+        except Exception:
+            scores = {}
+        if not isinstance(scores, dict):
+            scores = {}
+        existing = {row.game: row for row in
+                    DBS2MinigameScore.query.filter_by(user_id=self.user_id).all()}
+        for game, raw in scores.items():
+            value = DBS2MinigameScore.coerce_score(raw)
+            if value is None:
+                continue
+            row = existing.pop(game, None)
+            if row:
+                row.score = value
+            else:
+                db.session.add(DBS2MinigameScore(self.user_id, game, value))
+        for row in existing.values():
+            db.session.delete(row)
+    
     # ==================== UPDATE METHOD ====================
     
     def update(self, data):
@@ -335,7 +420,6 @@ class DBS2Player(db.Model):
         if 'has_seen_intro' in data:
             self._has_seen_intro = bool(data['has_seen_intro'])
         
-        db.session.commit()
         return self
     
     # ==================== READ METHOD ====================
@@ -384,39 +468,448 @@ class DBS2Player(db.Model):
     
     @staticmethod
     def get_or_create(user_id):
-        """Get existing player or create new one"""
-        player = DBS2Player.query.filter_by(user_id=user_id).first()
+        """Get existing player (with .user loaded in the same query) or create new one"""
+        player = DBS2Player.query_with_user().filter(DBS2Player.user_id == user_id).first()
         if not player:
-            player = DBS2Player(user_id)
-            db.session.add(player)
-            db.session.commit()
+            player = DBS2Player.create_for_user(user_id)
         return player
     
+    @staticmethod
+    def create_for_user(user_id):
+        """
+        Insert a player row for user_id, or return the row a concurrent request just
+        inserted (user_id is unique; the INSERT runs in a savepoint so losing the race
+        doesn't roll back the rest of the request). Committed with the rest of the request.
+        """
+        try:
+            with db.session.begin_nested():
+                player = DBS2Player(user_id)
+                db.session.add(player)
+        except IntegrityError:
+            player = DBS2Player.query_with_user().filter(DBS2Player.user_id == user_id).first()
+        return player
+    
+    @staticmethod
+    def load_with_user(uid):
+        """
+        (User, DBS2Player or None) for a user uid in one query: the player row is
+        outer-joined to the user, and the user's own eager relationships are skipped.
+        """
+        row = (db.session.query(User, DBS2Player)
+               .outerjoin(DBS2Player, DBS2Player.user_id == User.id)
+               .options(lazyload('*'))
+               .filter(User._uid == uid)
+               .first())
+        if row is None:
+            return None, None
+        return row[0], row[1]
+    
     @staticmethod
     def get_by_user_id(user_id):
         """Get player by user_id"""
         return DBS2Player.query.filter_by(user_id=user_id).first()
     
+    @staticmethod
+    def query_with_user():
+        """DBS2Player query that loads .user in the same SELECT (avoids one query per row in read())"""
+        return DBS2Player.query.options(joinedload(DBS2Player.user).lazyload('*'))
+    
     @staticmethod
     def get_all_players():
         """Get all players as list of dicts"""
-        players = DBS2Player.query.all()
+        players = DBS2Player.query_with_user().all()
         return [p.read() for p in players]
     
     @staticmethod
     def get_leaderboard(limit=10):
         """Get top players by crypto"""
-        players = DBS2Player.query.order_by(DBS2Player._crypto.desc()).limit(limit).all()
+        players = (DBS2Player.query_with_user()
+                   .order_by(DBS2Player._crypto.desc(), DBS2Player.user_id)
+                   .limit(limit).all())
         leaderboard = []
         for i, player in enumerate(players):
             data = player.read()
             data['rank'] = i + 1
             leaderboard.append(data)
         return leaderboard
+    
+    @staticmethod
+    def get_stats(top_n=5):
+        """
+        Game-wide totals for the admin dashboard.
+        One aggregate SELECT (SUM / COUNT with CASE) plus one top-N read on the _crypto index,
+        so memory stays constant regardless of player count.
+        """
+        def count_true(column):
+            return func.coalesce(func.sum(case((column == True, 1), else_=0)), 0)
+        
+        totals = db.session.query(
+            func.count(DBS2Player.id),
+            func.coalesce(func.sum(DBS2Player._crypto), 0),
+            func.coalesce(func.sum(DBS2Player._wallet_btc), 0.0),
+            func.coalesce(func.sum(DBS2Player._wallet_eth), 0.0),
+            func.coalesce(func.sum(DBS2Player._wallet_sol), 0.0),
+            func.coalesce(func.sum(DBS2Player._wallet_ada), 0.0),
+            func.coalesce(func.sum(DBS2Player._wallet_doge), 0.0),
+            count_true(DBS2Player._completed_crypto_miner),
+            count_true(DBS2Player._completed_infinite_user),
+            count_true(DBS2Player._completed_laundry),
+            count_true(DBS2Player._completed_ash_trail),
+            count_true(DBS2Player._completed_whackarat),
+            count_true(DBS2Player._scrap_crypto_miner),
+            count_true(DBS2Player._scrap_whackarat),
+            count_true(DBS2Player._scrap_laundry),
+            count_true(DBS2Player._scrap_ash_trail),
+            count_true(DBS2Player._scrap_infinite_user),
+        ).one()
+        (total_players, total_crypto, btc, eth, sol, ada, doge,
+         c_miner, c_infinite, c_laundry, c_ash, c_whack,
+         s_miner, s_whack, s_laundry, s_ash, s_infinite) = totals
+        total_crypto = int(total_crypto)
+        
+        top_rows = (
+            db.session.query(
+                User._uid, User._name, DBS2Player._crypto,
+                DBS2Player._wallet_btc, DBS2Player._wallet_eth, DBS2Player._wallet_sol,
+                DBS2Player._wallet_ada, DBS2Player._wallet_doge
+            )
+            .join(User, User.id == DBS2Player.user_id)
+            .order_by(DBS2Player._crypto.desc())
+            .limit(top_n)
+            .all()
+        )
+        top_players = [
+            {
+                'uid': uid,
+                'name': name,
+                'crypto': crypto or 0,
+                'wallet': {
+                    'satoshis': crypto or 0,
+                    'bitcoin': w_btc or 0.0,
+                    'ethereum': w_eth or 0.0,
+                    'solana': w_sol or 0.0,
+                    'cardano': w_ada or 0.0,
+                    'dogecoin': w_doge or 0.0
+                }
+            }
+            for uid, name, crypto, w_btc, w_eth, w_sol, w_ada, w_doge in top_rows
+        ]
+        
+        avg_crypto = total_crypto / total_players if total_players > 0 else 0
+        return {
+            'total_players': total_players,
+            'total_crypto_in_circulation': total_crypto,
+            'average_crypto': round(avg_crypto, 2),
+            'wallet_totals': {
+                'satoshis': total_crypto,
+                'bitcoin': float(btc),
+                'ethereum': float(eth),
+                'solana': float(sol),
+                'cardano': float(ada),
+                'dogecoin': float(doge)
+            },
+            'minigame_completions': {
+                'crypto_miner': int(c_miner),
+                'infinite_user': int(c_infinite),
+                'laundry': int(c_laundry),
+                'ash_trail': int(c_ash),
+                'whackarat': int(c_whack)
+            },
+            'scrap_ownership': {
+                'crypto_miner': int(s_miner),
+                'whackarat': int(s_whack),
+                'laundry': int(s_laundry),
+                'ash_trail': int(s_ash),
+                'infinite_user': int(s_infinite)
+            },
+            'top_players': top_players
+        }
+    
+    @staticmethod
+    def bulk_update(values, chunk_size=BULK_UPDATE_CHUNK_SIZE):
+        """
+        Apply column values/SQL expressions to every player with set-based UPDATE statements.
+        Tables larger than chunk_size are updated in id ranges so no single statement holds
+        the write lock too long. Wallet columns in values are recorded in wallet_transactions
+        (new - old per player, via INSERT ... SELECT) before the update runs.
+        Does not commit; returns the total affected row count.
+        """
+        ref, created_at = bulk_ref()
+        for coin_id, field in WALLET_FIELDS.items():
+            column = getattr(DBS2Player, field)
+            if column not in values:
+                continue
+            old = func.coalesce(column, 0)
+            delta = values[column] - old
+            record_transactions_from_select(
+                select(DBS2Player.user_id, literal(coin_id), delta, literal('admin_bulk'),
+                       literal(ref), literal(created_at))
+                .where(delta != 0)
+            )
+        low, high = db.session.query(func.min(DBS2Player.id), func.max(DBS2Player.id)).one()
+        if low is None:
+            return 0
+        stmt = update(DBS2Player).values(values).execution_options(synchronize_session=False)
+        if high - low < chunk_size:
+            return db.session.execute(stmt).rowcount
+        affected = 0
+        for start in range(low, high + 1, chunk_size):
+            result = db.session.execute(
+                stmt.where(DBS2Player.id >= start, DBS2Player.id < start + chunk_size)
+            )
+            affected += result.rowcount
+        return affected
+    
+    @staticmethod
+    def non_negative(expr):
+        """SQL equivalent of max(0, expr) for bulk balance updates"""
+        return case((expr < 0, 0), else_=expr)
+    
+    # Columns pulled by read_summaries(); keep in the same order as the row unpacking below
+    SUMMARY_COLUMNS = (
+        'id', 'user_id', '_crypto',
+        '_wallet_btc', '_wallet_eth', '_wallet_sol', '_wallet_ada', '_wallet_doge',
+        '_completed_crypto_miner', '_completed_infinite_user', '_completed_laundry',
+        '_completed_ash_trail', '_completed_whackarat', '_completed_all',
+        '_scrap_crypto_miner', '_scrap_whackarat', '_scrap_laundry',
+        '_scrap_ash_trail', '_scrap_infinite_user',
+        '_scores', 'updated_at',
+    )
+    
+    @staticmethod
+    def read_summaries(limit=None):
+        """
+        Lightweight projection of every player for list views, ordered by crypto desc.
+        Selects only the listed columns plus the user's uid/name as plain tuples in one
+        query instead of hydrating DBS2Player and User objects.
+        """
+        columns = [getattr(DBS2Player, name) for name in DBS2Player.SUMMARY_COLUMNS]
+        query = (db.session.query(*columns, User._uid, User._name)
+                 .outerjoin(User, User.id == DBS2Player.user_id)
+                 .order_by(DBS2Player._crypto.desc(), DBS2Player.user_id))
+        if limit:
+            query = query.limit(limit)
+        summaries = []
+        for row in query:
+            (player_id, user_id, crypto,
+             btc, eth, sol, ada, doge,
+             c_miner, c_infinite, c_laundry, c_ash, c_whack, c_all,
+             s_miner, s_whack, s_laundry, s_ash, s_infinite,
+             scores_raw, updated_at, uid, name) = row
+            try:
+                scores = json.loads(scores_raw or '{}')
+            except Exception:
+                scores = {}
+            crypto = crypto or 0
+            minigames = {
+                'crypto_miner': bool(c_miner),
+                'infinite_user': bool(c_infinite),
+                'laundry': bool(c_laundry),
+                'ash_trail': bool(c_ash),
+                'whackarat': bool(c_whack)
+            }
+            scraps = {
+                'crypto_miner': bool(s_miner),
+                'whackarat': bool(s_whack),
+                'laundry': bool(s_laundry),
+                'ash_trail': bool(s_ash),
+                'infinite_user': bool(s_infinite)
+            }
+            summaries.append({
+                'id': player_id,
+                'user_id': user_id,
+                'user_info': {'id': user_id, 'uid': uid, 'name': name} if uid is not None else {},
+                'crypto': crypto,
+                'satoshis': crypto,
+                'wallet': {
+                    'satoshis': crypto,
+                    'bitcoin': btc or 0.0,
+                    'ethereum': eth or 0.0,
+                    'solana': sol or 0.0,
+                    'cardano': ada or 0.0,
+                    'dogecoin': doge or 0.0
+                },
+                'scores': scores,
+                'completed_crypto_miner': minigames['crypto_miner'],
+                'completed_infinite_user': minigames['infinite_user'],
+                'completed_laundry': minigames['laundry'],
+                'completed_ash_trail': minigames['ash_trail'],
+                'completed_whackarat': minigames['whackarat'],
+                'completed_all': bool(c_all),
+                'minigames_completed': minigames,
+                'scrap_crypto_miner': scraps['crypto_miner'],
+                'scrap_whackarat': scraps['whackarat'],
+                'scrap_laundry': scraps['laundry'],
+                'scrap_ash_trail': scraps['ash_trail'],
+                'scrap_infinite_user': scraps['infinite_user'],
+                'scraps_owned': scraps,
+                'updated_at': updated_at.isoformat() if updated_at else None
+            })
+        return summaries
+
+
+@event.listens_for(db.session, 'before_flush')
+def _record_wallet_changes(session, flush_context, instances):
+    """Append wallet_transactions rows for balance columns changed through the ORM."""
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, DBS2Player):
+            continue
+        for coin_id, field in WALLET_FIELDS.items():
+            history = attributes.get_history(obj, field)
+            if not history.added:
+                continue
+            new = history.added[0] or 0
+            if history.deleted:
+                old = history.deleted[0] or 0
+            elif obj in session.new:
+                old = 0
+            else:
+                # Previous value was never loaded (expired or deferred); read the committed one
+                column = DBS2Player.__table__.c[DBS2Player.__mapper__.get_property(field).columns[0].name]
+                old = session.connection().execute(
+                    select(column).where(DBS2Player.__table__.c.id == obj.id)
+                ).scalar() or 0
+            record_transaction(obj.user_id, coin_id, new - old)
+
+
+def seed_wallet_opening_balances():
+    """
+    One 'opening' wallet transaction per non-zero balance that has no ledger rows yet, so
+    ledger sums (and rollup snapshots) start from the balances held before the ledger
+    existed. Run once when wallet_transactions is created. Does not commit.
+    """
+    ref, created_at = bulk_ref()
+    for coin_id, field in WALLET_FIELDS.items():
+        column = getattr(DBS2Player, field)
+        has_ledger = (select(WalletTransaction.id)
+                      .where(WalletTransaction.user_id == DBS2Player.user_id,
+                             WalletTransaction.coin == coin_id)
+                      .exists())
+        record_transactions_from_select(
+            select(DBS2Player.user_id, literal(coin_id), column, literal('opening'),
+                   literal(ref), literal(created_at))
+            .where(column.isnot(None), column != 0, ~has_ledger)
+        )
+
+
+class DBS2MinigameScore(db.Model):
+    """
+    Best score per (player, minigame), kept in sync with DBS2Player._scores.
+
+    The (game, score DESC, user_id) index lets /leaderboard/minigame read the
+    top K rows for a game directly instead of decoding every player's JSON.
+    """
+    __tablename__ = 'dbs2_minigame_scores'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'game', name='uq_dbs2_minigame_scores_user_game'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('dbs2_players.user_id'), nullable=False)
+    game = db.Column(db.String(64), nullable=False)
+    score = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __init__(self, user_id, game, score=0):
+        self.user_id = user_id
+        self.game = game
+        self.score = score
+    
+    @staticmethod
+    def coerce_score(value):
+        """Convert a raw JSON score to float; None if it is not numeric"""
+        if isinstance(value, bool):
+            return None
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    
+    @staticmethod
+    def upsert(user_id, game, score):
+        """Insert or raise the stored score for (user_id, game) (no commit)"""
+        value = DBS2MinigameScore.coerce_score(score)
+        if value is None:
+            return None
+        row = DBS2MinigameScore.query.filter_by(user_id=user_id, game=game).first()
+        if row:
+            row.score = value
+        else:
+            row = DBS2MinigameScore(user_id, game, value)
+            db.session.add(row)
+        return row
+    
+    @staticmethod
+    def top_rows(game, limit=10):
+        """(user_id, score, uid, name) tuples for one minigame, read from the (game, score DESC) index"""
+        return (
+            db.session.query(DBS2MinigameScore.user_id, DBS2MinigameScore.score, User._uid, User._name)
+            .join(User, User.id == DBS2MinigameScore.user_id)
+            .filter(DBS2MinigameScore.game == game)
+            .order_by(DBS2MinigameScore.score.desc(), DBS2MinigameScore.user_id)
+            .limit(limit)
+            .all()
+        )
+    
+    @staticmethod
+    def get_leaderboard(game, limit=10):
+        """Top scores for one minigame"""
+        return [
+            {
+                'user_info': {'uid': uid, 'name': name},
+                'score': score,
+                'game': game,
+                'rank': i + 1
+            }
+            for i, (_, score, uid, name) in enumerate(DBS2MinigameScore.top_rows(game, limit))
+        ]
+
+
+db.Index(
+    'ix_dbs2_minigame_scores_game_score',
+    DBS2MinigameScore.game,
+    DBS2MinigameScore.score.desc(),
+    DBS2MinigameScore.user_id
+)
+
+
+def backfill_dbs2_minigame_scores():
+    """Populate dbs2_minigame_scores from each player's _scores JSON when the table is empty."""
+    try:
+        if DBS2MinigameScore.query.limit(1).first():
+            return 0
+    except Exception as e:
+        db.session.rollback()
+        print('[DBS2] backfill minigame scores skipped:', e)
+        return 0
+    count = 0
+    rows = db.session.query(DBS2Player.user_id, DBS2Player._scores).yield_per(500)
+    for user_id, raw in rows:
+        try:
+            scores = json.loads(raw or '{}')
+        except Exception:
+            continue
+        if not isinstance(scores, dict):
+            continue
+        for game, value in scores.items():
+            value = DBS2MinigameScore.coerce_score(value)
+            if value is None:
+                continue
+            db.session.add(DBS2MinigameScore(user_id, game, value))
+            count += 1
+    try:
+        db.session.commit()
+        if count:
+            print(f'[DBS2] Backfilled {count} minigame score row(s)')
+    except Exception as e:
+        db.session.rollback()
+        print('[DBS2] backfill minigame scores failed:', e)
+        return 0
+    return count
 
 
 def migrate_dbs2_players_add_scrap_columns():
-    """Add scrap (and _has_seen_intro) columns to dbs2_players if missing (SQLite migration)."""
+    """Add scrap (and _has_seen_intro) columns and the _crypto index to dbs2_players if missing (SQLite migration)."""
     from sqlalchemy import text
     try:
         result = db.session.execute(text("PRAGMA table_info(dbs2_players)"))
@@ -434,6 +927,9 @@ def migrate_dbs2_players_add_scrap_columns():
         ('equipped_character', "TEXT DEFAULT 'chillguy'"),  # 👈 ADD THIS
 
     ]
+    indexes_to_add = [
+        ('ix_dbs2_players__crypto', '_crypto'),
+    ]
     for col_name, col_type in columns_to_add:
         if col_name not in existing:
             try:
@@ -445,6 +941,15 @@ def migrate_dbs2_players_add_scrap_columns():
             except Exception as e:
                 db.session.rollback()
                 print(f'[DBS2] migrate add column {col_name}:', e)
+    for index_name, col_name in indexes_to_add:
+        try:
+            db.session.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {index_name} ON dbs2_players ({col_name})"
+            ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f'[DBS2] migrate add index {index_name}:', e)
 
 
 def initDBS2Players():
@@ -452,6 +957,7 @@ def initDBS2Players():
     with app.app_context():
         db.create_all()
         migrate_dbs2_players_add_scrap_columns()
+        backfill_dbs2_minigame_scores()
         
         # Create test players if they don't exist
         test_uids = ['west', 'cyrus', 'maya']
@@ -43,6 +43,14 @@ class MicroBlog(db.Model):
    user = db.relationship('User', foreign_keys=[_user_id], backref=db.backref('microblogs', lazy=True))
    topic = db.relationship('Topic', foreign_keys=[_topic_id], backref=db.backref('microblogs', lazy=True))
 
+   # Feeds are ordered by (_timestamp DESC, id DESC) and paged with a keyset cursor, so each
+   # page is an index range scan: all posts, per topic, per user
+   __table_args__ = (
+       db.Index('ix_microblogs_timestamp_id', '_timestamp', 'id'),
+       db.Index('ix_microblogs_topic_timestamp_id', '_topic_id', '_timestamp', 'id'),
+       db.Index('ix_microblogs_user_timestamp_id', '_user_id', '_timestamp', 'id'),
+   )
+
 
    def __init__(self, user_id, content, topic_id=None, data=None):
        """
@@ -282,32 +290,62 @@ class MicroBlog(db.Model):
        return MicroBlog.query.get(microblog_id)
 
 
+   # ==================== FEED PAGINATION ====================
+
    @staticmethod
-   def get_all(limit=50):
-       """Get all micro blog posts (most recent first)"""
-       microblogs = MicroBlog.query.order_by(MicroBlog._timestamp.desc()).limit(limit).all()
+   def parse_cursor(value):
+       """Parse a 'before' cursor '<ISO timestamp>,<id>' into (datetime, id); None if empty, ValueError if malformed"""
+       if not value:
+           return None
+       timestamp, _, post_id = value.rpartition(',')
+       if not timestamp:
+           raise ValueError('Cursor must be <timestamp>,<id>')
+       return datetime.fromisoformat(timestamp), int(post_id)
+
+
+   @staticmethod
+   def next_cursor(posts, limit):
+       """Cursor for the page after posts (read() dicts), or None when this was the last page"""
+       if not posts or len(posts) < limit:
+           return None
+       return f"{posts[-1]['timestamp']},{posts[-1]['id']}"
+
+
+   @staticmethod
+   def _feed(query, limit, before=None):
+       """Newest-first page of query, continuing after the (timestamp, id) cursor `before`"""
+       if before is not None:
+           timestamp, post_id = before
+           query = query.filter(db.or_(
+               MicroBlog._timestamp < timestamp,
+               db.and_(MicroBlog._timestamp == timestamp, MicroBlog.id < post_id),
+           ))
+       microblogs = query.order_by(MicroBlog._timestamp.desc(), MicroBlog.id.desc()).limit(limit).all()
        return [microblog.read() for microblog in microblogs]
 
 
    @staticmethod
-   def get_by_topic(topic_id, limit=50):
+   def get_all(limit=50, before=None):
+       """Get all micro blog posts (most recent first)"""
+       return MicroBlog._feed(MicroBlog.query, limit, before)
+
+
+   @staticmethod
+   def get_by_topic(topic_id, limit=50, before=None):
        """Get all micro blog posts for a specific topic"""
-       microblogs = MicroBlog.query.filter_by(_topic_id=topic_id).order_by(MicroBlog._timestamp.desc()).limit(limit).all()
-       return [microblog.read() for microblog in microblogs]
+       return MicroBlog._feed(MicroBlog.query.filter_by(_topic_id=topic_id), limit, before)
 
 
    @staticmethod
-   def get_by_user(user_id, limit=50):
+   def get_by_user(user_id, limit=50, before=None):
        """Get all micro blog posts by a specific user"""
-       microblogs = MicroBlog.query.filter_by(_user_id=user_id).order_by(MicroBlog._timestamp.desc()).limit(limit).all()
-       return [microblog.read() for microblog in microblogs]
+       return MicroBlog._feed(MicroBlog.query.filter_by(_user_id=user_id), limit, before)
 
 
    @staticmethod
-   def search_content(search_term, limit=50):
+   def search_content(search_term, limit=50, before=None):
        """Search micro blog posts by content"""
-       microblogs = MicroBlog.query.filter(MicroBlog._content.contains(search_term)).order_by(MicroBlog._timestamp.desc()).limit(limit).all()
-       return [microblog.read() for microblog in microblogs]
+       return MicroBlog._feed(MicroBlog.query.filter(MicroBlog._content.contains(search_term)), limit, before)
 
 
 
@@ -453,16 +491,13 @@ class Topic(db.Model):
        current_count = self.get_user_post_count(user_id)
        return current_count < self._max_posts_per_user
   
-   def get_recent_posts(self, limit=10, user_id=None):
-       """Get recent posts for this topic"""
-       query = MicroBlog.query.filter_by(_topic_id=self.id)
-      
+   def get_recent_posts(self, limit=10, user_id=None, before=None):
+       """Get recent posts for this topic (newest first, continuing after the `before` cursor)"""
        # If not allowing anonymous and no user_id, return empty
        if not self._allow_anonymous and not user_id:
            return []
       
-       posts = query.order_by(MicroBlog._timestamp.desc()).limit(limit).all()
-       return [post.read() for post in posts]
+       return MicroBlog.get_by_topic(self.id, limit, before)
   
    @staticmethod
    def get_by_page_path(page_path):
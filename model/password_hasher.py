@@ -0,0 +1,179 @@
+"""
+Password hashing for User.
+
+The scheme and cost come from app.config['PASSWORD_HASH_METHOD']:
+- Werkzeug methods: 'pbkdf2:sha256:<iterations>' or 'scrypt:<n>:<r>:<p>'
+- 'argon2' (argon2id with argon2-cffi defaults), when argon2-cffi is installed
+
+Stored hashes carry their own scheme and cost, so verify_password() accepts any of
+them and needs_rehash() tells the login path to re-hash with the configured method
+(transparent migration when the method or cost changes).
+
+Verification can be offloaded to a small process pool (PASSWORD_HASH_WORKERS > 0) so
+login bursts use at most that many cores for hashing instead of every request thread.
+Run scripts/bench_password_hash.py to pick a cost.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import re
+import threading
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    from argon2 import PasswordHasher as _Argon2PasswordHasher
+    from argon2.exceptions import InvalidHashError, VerificationError
+except ImportError:  # optional dependency
+    _Argon2PasswordHasher = None
+
+# verify() reads the parameters from the stored hash, so one instance serves every argon2 hash
+_argon2_verifier = _Argon2PasswordHasher() if _Argon2PasswordHasher is not None else None
+
+from __init__ import app
+
+
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+WERKZEUG_PREFIXES = ('pbkdf2:', 'scrypt:')
+ARGON2_PREFIX = '$argon2'
+# Complete stored hashes: 'pbkdf2:<hash>:<iterations>$<salt>$<hex digest>' or
+# 'scrypt:<n>:<r>:<p>$<salt>$<hex digest>', and PHC-encoded argon2 hashes
+WERKZEUG_HASH = re.compile(r'(pbkdf2:[a-z0-9_]+:\d+|scrypt:\d+:\d+:\d+)\$[A-Za-z0-9]+\$(?:[0-9a-f]{2})+')
+ARGON2_HASH = re.compile(r'\$argon2(?:id|i|d)\$v=\d+\$m=\d+,t=\d+,p=\d+\$[A-Za-z0-9+/]+\$[A-Za-z0-9+/]+')
+
+
+class WerkzeugHasher:
+    """pbkdf2 / scrypt via werkzeug.security; method includes the cost, e.g. 'pbkdf2:sha256:600000'"""
+
+    def __init__(self, method):
+        self.method = method
+        self._stored_method = None
+
+    def hash(self, password):
+        return generate_password_hash(password, self.method, salt_length=16)
+
+    @property
+    def stored_method(self):
+        """Method prefix werkzeug writes for self.method; short forms gain their defaults
+        ('pbkdf2:sha256' -> 'pbkdf2:sha256:1000000', 'scrypt' -> 'scrypt:32768:8:1')"""
+        if self._stored_method is None:
+            # one throwaway hash per process; werkzeug doesn't expose its defaults otherwise
+            self._stored_method = generate_password_hash('', self.method, salt_length=1).split('$', 1)[0]
+        return self._stored_method
+
+    @staticmethod
+    def verify(stored, password):
+        return check_password_hash(stored, password)
+
+    def needs_rehash(self, stored):
+        # werkzeug stores 'method$salt$hash' with the cost spelled out
+        return stored.split('$', 1)[0] != self.stored_method
+
+
+class Argon2Hasher:
+    """argon2id via argon2-cffi (optional dependency)"""
+
+    def __init__(self):
+        if _Argon2PasswordHasher is None:
+            raise RuntimeError("PASSWORD_HASH_METHOD='argon2' requires the argon2-cffi package")
+        self._hasher = _Argon2PasswordHasher()
+        self.method = 'argon2'
+
+    def hash(self, password):
+        return self._hasher.hash(password)
+
+    @staticmethod
+    def verify(stored, password):
+        if _argon2_verifier is None:
+            return False
+        try:
+            return _argon2_verifier.verify(stored, password)
+        except (VerificationError, InvalidHashError):
+            return False
+
+    def needs_rehash(self, stored):
+        return not stored.startswith(ARGON2_PREFIX) or self._hasher.check_needs_rehash(stored)
+
+
+_hashers = {}
+
+
+def get_hasher(method=None):
+    """Hasher for method (default: app.config['PASSWORD_HASH_METHOD'])"""
+    method = method or app.config.get('PASSWORD_HASH_METHOD') or DEFAULT_METHOD
+    hasher = _hashers.get(method)
+    if hasher is None:
+        hasher = _hashers[method] = Argon2Hasher() if method == 'argon2' else WerkzeugHasher(method)
+    return hasher
+
+
+def is_password_hash(value):
+    """True if value parses completely as a stored hash (any supported scheme); a plaintext
+    that merely starts like one (e.g. 'pbkdf2:hunter2') is not"""
+    return isinstance(value, str) and bool(WERKZEUG_HASH.fullmatch(value) or ARGON2_HASH.fullmatch(value))
+
+
+def hash_password(password):
+    return get_hasher().hash(password)
+
+
+def _hash_with(method, password):
+    return get_hasher(method).hash(password)
+
+
+def hash_passwords(passwords):
+    """Hash many passwords in parallel (bulk import); returns hashes in input order.
+
+    Uses the PASSWORD_HASH_WORKERS pool when enabled, otherwise a thread per core
+    (hashlib pbkdf2/scrypt and argon2-cffi release the GIL while hashing).
+    """
+    passwords = list(passwords)
+    if len(passwords) < 2:
+        return [hash_password(p) for p in passwords]
+    method = get_hasher().method
+    methods = [method] * len(passwords)
+    executor = _executor()
+    if executor is not None:
+        return list(executor.map(_hash_with, methods, passwords, chunksize=8))
+    with ThreadPoolExecutor(max_workers=min(len(passwords), os.cpu_count() or 1)) as pool:
+        return list(pool.map(_hash_with, methods, passwords))
+
+
+def _verify(stored, password):
+    if stored.startswith(ARGON2_PREFIX):
+        return Argon2Hasher.verify(stored, password)
+    return WerkzeugHasher.verify(stored, password)
+
+
+# ==================== OPTIONAL PROCESS POOL ====================
+
+_pool = {'executor': None, 'pid': None}
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    """Per-process pool (recreated after fork, e.g. in each gunicorn worker); None when disabled"""
+    workers = app.config.get('PASSWORD_HASH_WORKERS', 0)
+    if workers <= 0:
+        return None
+    pid = os.getpid()
+    if _pool['executor'] is None or _pool['pid'] != pid:
+        with _pool_lock:
+            if _pool['executor'] is None or _pool['pid'] != pid:
+                _pool['executor'] = ProcessPoolExecutor(max_workers=workers)
+                _pool['pid'] = pid
+    return _pool['executor']
+
+
+def verify_password(stored, password):
+    """Check password against a stored hash of any supported scheme"""
+    if not stored or password is None:
+        return False
+    executor = _executor()
+    if executor is None:
+        return _verify(stored, password)
+    return executor.submit(_verify, stored, password).result()
+
+
+def needs_rehash(stored):
+    """True if stored was hashed with a different scheme or cost than the configured method"""
+    return get_hasher().needs_rehash(stored)
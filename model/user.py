@@ -3,7 +3,7 @@ from flask import current_app
 from flask_login import UserMixin
 from datetime import date
 from sqlalchemy.exc import IntegrityError
-from werkzeug.security import generate_password_hash, check_password_hash
+from model.password_hasher import hash_password, hash_passwords, is_password_hash, needs_rehash, verify_password
 import os
 import json
 
@@ -267,19 +267,31 @@ class User(db.Model, UserMixin):
     # set password, this is conventional setter with business logic
     def set_password(self, password):
         """Set password: hash if not already hashed, else set directly."""
-        if password and password.startswith("pbkdf2:sha256:"):
+        if is_password_hash(password):
             # Already hashed, set directly
             self._password = password
         else:
-            # Not hashed, hash it
-            self._password = generate_password_hash(password, "pbkdf2:sha256", salt_length=10)            
+            # Not hashed, hash it with the configured method (PASSWORD_HASH_METHOD)
+            self._password = hash_password(password)
 
     # check password parameter versus stored/encrypted password
     def is_password(self, password):
         """Check against hashed password."""
-        result = check_password_hash(self._password, password)
+        result = verify_password(self._password, password)
         return result
 
+    def rehash_password_if_needed(self, password):
+        """After a successful login, re-hash with the configured method/cost if the stored hash uses another"""
+        if not needs_rehash(self._password):
+            return False
+        try:
+            self.set_password(password)
+            db.session.commit()
+            return True
+        except Exception:
+            db.session.rollback()
+            return False
+
     # output content using str(object) in human readable form, uses getter
     # output content using json dumps, this is ready for API response
     def __str__(self):
@@ -622,6 +634,126 @@ class User(db.Model, UserMixin):
             if os.path.exists(old_path):
                 os.rename(old_path, new_path)
 
+""" Bulk Import """
+
+BULK_IMPORT_BATCH_SIZE = 200
+
+
+def bulk_import_users(records):
+    """
+    Create users and their section enrollments in batched transactions.
+
+    :param records: A list of validated dicts with 'name', 'uid', 'password' and the optional
+                    'email', 'sid', 'school', 'kasm_server_needed', 'class' and 'sections'
+                    ([{'abbreviation': ..., 'year': int}]) keys.
+    :return: (created_uids, existing_uids, errors). Existing users are not modified except
+             for section enrollments, matching the single-user endpoint.
+    """
+    errors = []
+    if not records:
+        return [], [], errors
+
+    # one lookup for every section abbreviation in the batch
+    abbreviations = {s.get('abbreviation') for r in records for s in (r.get('sections') or [])}
+    sections_by_abbr = {}
+    if abbreviations:
+        sections_by_abbr = {s.abbreviation: s for s in Section.query.filter(Section._abbreviation.in_(abbreviations)).all()}
+
+    uids = [r['uid'] for r in records]
+    users_by_uid = {}
+    for i in range(0, len(uids), BULK_IMPORT_BATCH_SIZE):
+        chunk = uids[i:i + BULK_IMPORT_BATCH_SIZE]
+        users_by_uid.update({u.uid: u for u in User.query.filter(User._uid.in_(chunk)).all()})
+
+    new_records = [r for r in records if r['uid'] not in users_by_uid]
+    existing_uids = [r['uid'] for r in records if r['uid'] in users_by_uid]
+    hashes = dict(zip((r['uid'] for r in new_records), hash_passwords(r['password'] for r in new_records)))
+
+    created_uids = []
+    kasm_users = []
+    for i in range(0, len(records), BULK_IMPORT_BATCH_SIZE):
+        batch = records[i:i + BULK_IMPORT_BATCH_SIZE]
+        batch_new = []
+        try:
+            for record in batch:
+                if record['uid'] in users_by_uid:
+                    continue
+                user = User(
+                    name=record['name'],
+                    uid=record['uid'],
+                    password=hashes[record['uid']],
+                    kasm_server_needed=bool(record.get('kasm_server_needed', False)),
+                    school=record.get('school') or "Unknown",
+                    sid=record.get('sid'),
+                    classes=[record['class']] if isinstance(record.get('class'), str) else record.get('class'),
+                )
+                user.email = record.get('email')
+                batch_new.append(user)
+            db.session.add_all(batch_new)
+            db.session.flush()  # assigns ids for the user_sections rows
+
+            batch_users = {u.uid: u for u in batch_new}
+            batch_users.update({r['uid']: users_by_uid[r['uid']] for r in batch if r['uid'] in users_by_uid})
+            enrolled = set()
+            existing_ids = [users_by_uid[r['uid']].id for r in batch if r['uid'] in users_by_uid]
+            if existing_ids:
+                enrolled = set(db.session.query(UserSection.user_id, UserSection.section_id)
+                               .filter(UserSection.user_id.in_(existing_ids)).all())
+
+            inserts = []
+            year_updates = []
+            for record in batch:
+                user = batch_users[record['uid']]
+                missing = []
+                for section_data in record.get('sections') or []:
+                    section = sections_by_abbr.get(section_data.get('abbreviation'))
+                    if section is None:
+                        missing.append(section_data.get('abbreviation'))
+                        continue
+                    row = {'user_id': user.id, 'section_id': section.id,
+                           'year': int(section_data.get('year', default_year()))}
+                    if (user.id, section.id) in enrolled:
+                        year_updates.append(row)
+                    else:
+                        enrolled.add((user.id, section.id))
+                        inserts.append(row)
+                if missing:
+                    errors.append({'message': f'Failed to add sections {missing} to user {record["uid"]}'})
+            if inserts:
+                db.session.execute(UserSection.__table__.insert(), inserts)
+            if year_updates:
+                table = UserSection.__table__
+                db.session.execute(
+                    table.update()
+                    .where(table.c.user_id == db.bindparam('b_user_id'))
+                    .where(table.c.section_id == db.bindparam('b_section_id'))
+                    .values(year=db.bindparam('b_year')),
+                    [{'b_user_id': r['user_id'], 'b_section_id': r['section_id'], 'b_year': r['year']} for r in year_updates],
+                )
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            failed = [u.uid for u in batch_new]
+            errors.append({'message': f'Failed to import users {failed}: {e.orig}'})
+            continue
+        created_uids.extend(u.uid for u in batch_new)
+        kasm_users.extend((batch_users[r['uid']], r) for r in batch
+                          if r['uid'] not in users_by_uid and r.get('kasm_server_needed'))
+
+    # Kasm accounts are external; provision them only after the rows are committed
+    for user, record in kasm_users:
+        try:
+            kasm_user = KasmUser()
+            kasm_user.post(user.name, user.uid, record['password'])
+            groups = [s.get('abbreviation') for s in record.get('sections') or [] if s.get('abbreviation') in sections_by_abbr]
+            if groups:
+                kasm_user.post_groups(user.uid, groups)
+        except Exception as e:
+            print(f"Kasm API error for user {user.uid}: {e}")
+
+    return created_uids, existing_uids, errors
+
+
 """Database Creation and Testing """
 
 # Builds working data set for testing
@@ -0,0 +1,214 @@
+"""
+Wallet Transaction Ledger - append-only history of DBS2 wallet balance changes
+
+Balances themselves stay on dbs2_players (_crypto, _wallet_*), which keeps balance
+reads O(1). Every change to them is also appended here:
+- ORM changes (add_to_wallet, direct column sets) are detected at flush time
+- credit()/debit() ledger UPDATEs record their own rows
+- admin bulk actions record one INSERT ... SELECT per action
+
+Rows are buffered on the session and written with one batched INSERT when the
+transaction commits. rollup_wallet_snapshots() periodically materializes per-user
+balance snapshots so audits only replay transactions after the latest snapshot.
+"""
+from datetime import datetime
+
+from flask import has_request_context, request
+from sqlalchemy import event, func, insert, or_
+
+from __init__ import db
+
+
+class WalletTransaction(db.Model):
+    """
+    One signed balance change for one coin.
+
+    kind: 'credit' | 'debit' | 'adjust' | 'admin_bulk' | 'opening' (balance held before the ledger existed)
+    ref: request path that caused the change (for audits), if any
+    """
+    __tablename__ = 'wallet_transactions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    coin = db.Column(db.String(16), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    kind = db.Column(db.String(32), nullable=False, default='adjust')
+    ref = db.Column(db.String(128), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_wallet_transactions_user_created', 'user_id', 'created_at', 'id'),
+    )
+
+    def read(self):
+        return {
+            'id': self.id,
+            'coin': self.coin,
+            'amount': self.amount,
+            'kind': self.kind,
+            'ref': self.ref,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    @staticmethod
+    def get_history(user_id, limit=50, before=None):
+        """
+        Keyset page of a user's transactions, newest first.
+        before: (created_at, id) of the last row of the previous page, or None for the first page.
+        Returns (rows, next_cursor) where next_cursor is None on the last page.
+        """
+        query = WalletTransaction.query.filter(WalletTransaction.user_id == user_id)
+        if before:
+            created_at, txn_id = before
+            query = query.filter(or_(
+                WalletTransaction.created_at < created_at,
+                (WalletTransaction.created_at == created_at) & (WalletTransaction.id < txn_id)
+            ))
+        rows = (query.order_by(WalletTransaction.created_at.desc(), WalletTransaction.id.desc())
+                .limit(limit + 1).all())
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = f'{last.created_at.isoformat()},{last.id}'
+        return rows, next_cursor
+
+
+class WalletBalanceSnapshot(db.Model):
+    """Materialized balances for one user as of wallet_transactions.id == last_txn_id"""
+    __tablename__ = 'wallet_balance_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    last_txn_id = db.Column(db.Integer, nullable=False)
+    satoshis = db.Column(db.Float, nullable=False, default=0)
+    bitcoin = db.Column(db.Float, nullable=False, default=0)
+    ethereum = db.Column(db.Float, nullable=False, default=0)
+    solana = db.Column(db.Float, nullable=False, default=0)
+    cardano = db.Column(db.Float, nullable=False, default=0)
+    dogecoin = db.Column(db.Float, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_wallet_balance_snapshots_user_txn', 'user_id', 'last_txn_id'),
+    )
+
+    COINS = ('satoshis', 'bitcoin', 'ethereum', 'solana', 'cardano', 'dogecoin')
+
+    def read(self):
+        data = {coin: getattr(self, coin) for coin in WalletBalanceSnapshot.COINS}
+        data['satoshis'] = int(data['satoshis'])
+        return {
+            'balances': data,
+            'last_txn_id': self.last_txn_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    @staticmethod
+    def latest(user_id):
+        return (WalletBalanceSnapshot.query.filter_by(user_id=user_id)
+                .order_by(WalletBalanceSnapshot.last_txn_id.desc()).first())
+
+
+# ==================== BUFFERED WRITES ====================
+
+def _ref():
+    return request.path[:128] if has_request_context() else None
+
+
+def record_transaction(user_id, coin, amount, kind='adjust'):
+    """Stage one transaction row; written with the rest of the batch at commit"""
+    if not amount:
+        return
+    db.session.info.setdefault('wallet_txn_buffer', []).append({
+        'user_id': user_id,
+        'coin': coin,
+        'amount': float(amount),
+        'kind': kind,
+        'ref': _ref(),
+        'created_at': datetime.utcnow()
+    })
+
+
+def record_transactions_from_select(select_stmt):
+    """
+    Record many rows at once with INSERT ... SELECT (admin bulk actions).
+    select_stmt must yield (user_id, coin, amount, kind, ref, created_at) columns.
+    """
+    db.session.execute(
+        insert(WalletTransaction).from_select(
+            ['user_id', 'coin', 'amount', 'kind', 'ref', 'created_at'], select_stmt
+        )
+    )
+
+
+def bulk_ref():
+    """(ref, created_at) literals for record_transactions_from_select callers"""
+    return _ref(), datetime.utcnow()
+
+
+@event.listens_for(db.session, 'before_commit')
+def _write_wallet_transactions(session):
+    # Pending changes may still record wallet rows; commit would flush them anyway, so flush now
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    rows = session.info.pop('wallet_txn_buffer', None)
+    if not rows:
+        return
+    # The table is created by verify_dbs2_schema(); a failed insert fails the commit so
+    # balances never change without their audit rows
+    session.execute(insert(WalletTransaction), rows)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_wallet_transactions(session, previous_transaction):
+    session.info.pop('wallet_txn_buffer', None)
+
+
+# ==================== SNAPSHOT ROLLUP ====================
+
+def rollup_wallet_snapshots():
+    """
+    Write a new WalletBalanceSnapshot for every user with transactions after their latest
+    snapshot: previous snapshot + SUM(amount) per coin. Intended to run periodically
+    (flask custom rollup_wallets, e.g. from cron). Returns the number of snapshots written.
+    """
+    latest = (db.session.query(WalletBalanceSnapshot.user_id,
+                               func.max(WalletBalanceSnapshot.last_txn_id).label('last_txn_id'))
+              .group_by(WalletBalanceSnapshot.user_id).subquery())
+    deltas = (
+        db.session.query(WalletTransaction.user_id, WalletTransaction.coin,
+                         func.sum(WalletTransaction.amount), func.max(WalletTransaction.id))
+        .outerjoin(latest, latest.c.user_id == WalletTransaction.user_id)
+        .filter(WalletTransaction.id > func.coalesce(latest.c.last_txn_id, 0))
+        .group_by(WalletTransaction.user_id, WalletTransaction.coin)
+        .all()
+    )
+    if not deltas:
+        return 0
+
+    changed = {}
+    for user_id, coin, total, max_id in deltas:
+        entry = changed.setdefault(user_id, {'last_txn_id': 0, 'deltas': {}})
+        entry['deltas'][coin] = total or 0
+        entry['last_txn_id'] = max(entry['last_txn_id'], max_id)
+
+    previous = {
+        snap.user_id: snap
+        for snap in WalletBalanceSnapshot.query
+        .join(latest, (latest.c.user_id == WalletBalanceSnapshot.user_id) &
+              (latest.c.last_txn_id == WalletBalanceSnapshot.last_txn_id))
+        .filter(WalletBalanceSnapshot.user_id.in_(list(changed)))
+    }
+    now = datetime.utcnow()
+    rows = []
+    for user_id, entry in changed.items():
+        prev = previous.get(user_id)
+        row = {'user_id': user_id, 'last_txn_id': entry['last_txn_id'], 'created_at': now}
+        for coin in WalletBalanceSnapshot.COINS:
+            base = getattr(prev, coin) if prev else 0
+            row[coin] = (base or 0) + entry['deltas'].get(coin, 0)
+        rows.append(row)
+    db.session.execute(insert(WalletBalanceSnapshot), rows)
+    db.session.commit()
+    return len(rows)
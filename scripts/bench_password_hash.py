@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+""" bench_password_hash.py
+Benchmarks password hashing methods to pick PASSWORD_HASH_METHOD / PASSWORD_HASH_WORKERS.
+
+For each method it reports the time to hash and to verify one password, and the
+resulting logins per second per core (one verification per login).
+
+Usage: Run from the root of the project:
+> scripts/bench_password_hash.py
+> scripts/bench_password_hash.py pbkdf2:sha256:600000 scrypt:16384:8:1 argon2
+> scripts/bench_password_hash.py --seconds 5 --workers 4
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from __init__ import app
+from model.password_hasher import get_hasher, verify_password, _verify
+
+DEFAULT_METHODS = [
+    'pbkdf2:sha256:1000000',  # werkzeug 3 default (what 'pbkdf2:sha256' hashes used before)
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:310000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'argon2',
+]
+
+
+def _timed(func, seconds):
+    """(calls, elapsed) running func repeatedly for about `seconds`"""
+    calls, start = 0, time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return calls, elapsed
+
+
+def bench(method, seconds, workers):
+    try:
+        hasher = get_hasher(method)
+    except RuntimeError as e:
+        return f'{method:<26} skipped ({e})'
+    stored = hasher.hash('correct horse battery staple')
+
+    calls, elapsed = _timed(lambda: hasher.hash('correct horse battery staple'), seconds / 2)
+    hash_ms = elapsed / calls * 1000
+    calls, elapsed = _timed(lambda: verify_password(stored, 'correct horse battery staple'), seconds / 2)
+    verify_ms = elapsed / calls * 1000
+    line = f'{method:<26} hash {hash_ms:8.1f} ms  verify {verify_ms:8.1f} ms  {1000 / verify_ms:8.1f} logins/s/core'
+
+    if workers > 1:
+        # Throughput with verification spread over a process pool
+        batch = workers * 4
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_verify, [stored] * workers, ['x'] * workers))  # warm up
+            start = time.perf_counter()
+            done = 0
+            while time.perf_counter() - start < seconds:
+                list(pool.map(_verify, [stored] * batch, ['correct horse battery staple'] * batch))
+                done += batch
+            rate = done / (time.perf_counter() - start)
+        line += f'  {rate:8.1f} logins/s with {workers} processes'
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark password hashing methods')
+    parser.add_argument('methods', nargs='*', help='methods to compare (default: a built-in list)')
+    parser.add_argument('--seconds', type=float, default=2.0, help='time per method (default 2)')
+    parser.add_argument('--workers', type=int, default=0, help='also measure a process pool of this size')
+    args = parser.parse_args()
+
+    with app.app_context():
+        app.config['PASSWORD_HASH_WORKERS'] = 0  # measure inline cost
+        print(f"Configured PASSWORD_HASH_METHOD: {app.config.get('PASSWORD_HASH_METHOD')}  (cores: {os.cpu_count()})")
+        for method in args.methods or DEFAULT_METHODS:
+            print(bench(method, args.seconds, args.workers))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+""" bench_broadcast.py
+Load test for the DBS2 chat broadcast in dbs2_websocket_server.py.
+
+Starts the server in-process on a free local port, connects N clients, has one of
+them send chat messages and reports the delivery latency (send -> every other
+client's receive) at p50 / p99 / max. Optional --slow clients connect but never
+read, to check that they don't hold up delivery to everyone else.
+
+Usage: Run from the socket directory:
+> python bench_broadcast.py
+> python bench_broadcast.py --clients 1000 --messages 200 --slow 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# keep benchmark messages out of the real chat history
+os.environ["CHAT_DB"] = os.path.join(tempfile.mkdtemp(), "bench_chat.db")
+import websockets
+import dbs2_websocket_server as server
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def _receiver(uri, expected, latencies, ready):
+    async with websockets.connect(uri, max_queue=None) as ws:
+        ready.release()
+        received = 0
+        while received < expected:
+            data = json.loads(await ws.recv())
+            if data.get("type") != "chat" or data.get("name") != "bench":
+                continue
+            latencies.append(time.perf_counter() - float(data["text"]))
+            received += 1
+
+
+async def _slow_client(uri, stop, ready):
+    # never calls recv(): the client stops reading once its queue is full, so the server's buffer grows
+    async with websockets.connect(uri, max_queue=1):
+        ready.release()
+        await stop.wait()
+
+
+async def run(clients, messages, slow, interval):
+    async with websockets.serve(server.broadcast_handler, "127.0.0.1", 0, ping_interval=None) as ws_server:
+        port = ws_server.sockets[0].getsockname()[1]
+        uri = f"ws://127.0.0.1:{port}"
+        ready = asyncio.Semaphore(0)
+        stop = asyncio.Event()
+        latencies = []
+
+        receivers = [asyncio.create_task(_receiver(uri, messages, latencies, ready)) for _ in range(clients)]
+        slow_tasks = [asyncio.create_task(_slow_client(uri, stop, ready)) for _ in range(slow)]
+        for _ in range(clients + slow):
+            await ready.acquire()
+        print(f"{len(server.connected)} clients connected ({slow} slow)")
+
+        async with websockets.connect(uri) as sender:
+            start = time.perf_counter()
+            for _ in range(messages):
+                # the chat text carries the send time, so receivers can measure delivery latency
+                await sender.send(json.dumps({"name": "bench", "text": repr(time.perf_counter())}))
+                await asyncio.sleep(interval)
+            await asyncio.wait_for(asyncio.gather(*receivers), timeout=60)
+            elapsed = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*slow_tasks, return_exceptions=True)
+
+    latencies.sort()
+    ms = [v * 1000 for v in latencies]
+    print(f"{len(ms)} deliveries in {elapsed:.2f}s ({len(ms) / elapsed:,.0f}/s)")
+    print(f"latency p50 {_percentile(ms, 50):.1f} ms  p99 {_percentile(ms, 99):.1f} ms  max {ms[-1]:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure DBS2 chat broadcast delivery latency")
+    parser.add_argument("--clients", type=int, default=1000, help="reading clients (default 1000)")
+    parser.add_argument("--messages", type=int, default=100, help="messages to broadcast (default 100)")
+    parser.add_argument("--slow", type=int, default=0, help="extra clients that never read (default 0)")
+    parser.add_argument("--interval", type=float, default=0.01, help="seconds between messages (default 0.01)")
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.messages, args.slow, args.interval))
+
+
+if __name__ == "__main__":
+    main()
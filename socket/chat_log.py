@@ -0,0 +1,149 @@
+"""
+Persistent chat history for the DBS2 WebSocket server.
+
+Messages are appended to a SQLite table in WAL mode, so history survives restarts
+and several socket processes on one host can share it. Every message gets a
+monotonically increasing seq; clients pass the last seq they saw (since=<seq>) to
+fetch only what they missed. The newest messages of each room are also kept in an
+in-memory tail so replaying recent history doesn't touch the database.
+
+The table doubles as the bus between socket processes: poll() returns messages
+other processes appended, so each process can deliver them to its own subscribers.
+"""
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dbs2_chat.db")
+DEFAULT_ROOM = "basement"
+
+
+class ChatLog:
+    """Append-only message log: SQLite WAL table + per-room in-memory tail of serialized frames."""
+
+    def __init__(self, path=None, tail_size=500, retain=10000):
+        self.path = path or os.environ.get("CHAT_DB") or DEFAULT_PATH
+        self.tail_size = tail_size
+        self.retain = retain  # rows kept in the table; older ones are pruned
+        # The socket server calls this from a single dedicated thread (not the one that created it)
+        self._db = sqlite3.connect(self.path, isolation_level=None, timeout=5, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_messages ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created_at REAL NOT NULL,"
+            " payload TEXT NOT NULL)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(chat_messages)")}
+        if "room" not in columns:
+            self._db.execute(f"ALTER TABLE chat_messages ADD COLUMN room TEXT NOT NULL DEFAULT '{DEFAULT_ROOM}'")
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_chat_messages_room_seq ON chat_messages (room, seq)")
+        # room -> deque of (seq, frame), oldest first; loaded on first use
+        self._tails = {}
+        self._own = set()  # seqs appended by this process that _sync() hasn't reached yet
+        self._pending = []  # (room, frame) appended by other processes, not yet poll()ed
+        self._appends = 0
+        row = self._db.execute("SELECT MAX(seq) FROM chat_messages").fetchone()
+        self._last_seq = row[0] or 0  # everything up to here is reflected in the loaded tails
+
+    @staticmethod
+    def _frame(seq, payload):
+        # payload is a JSON object string; splice seq in rather than re-parsing it
+        return '{"seq": %d, %s' % (seq, payload[1:])
+
+    @staticmethod
+    def _insert_sorted(tail, seq, frame):
+        if not tail or tail[-1][0] < seq:
+            tail.append((seq, frame))
+            return
+        index = len(tail)
+        while index > 0 and tail[index - 1][0] > seq:
+            index -= 1
+        if index > 0 and tail[index - 1][0] == seq:
+            return
+        if len(tail) == tail.maxlen:
+            if index == 0:
+                return  # older than everything kept
+            tail.popleft()
+            index -= 1
+        tail.insert(index, (seq, frame))
+
+    def _tail(self, room):
+        tail = self._tails.get(room)
+        if tail is None:
+            self._sync()
+            rows = self._db.execute(
+                "SELECT seq, payload FROM chat_messages WHERE room = ? AND seq <= ? ORDER BY seq DESC LIMIT ?",
+                (room, self._last_seq, self.tail_size),
+            ).fetchall()
+            tail = self._tails[room] = deque(
+                ((seq, self._frame(seq, payload)) for seq, payload in reversed(rows)), maxlen=self.tail_size)
+        return tail
+
+    def _sync(self):
+        """Pull in rows appended by other processes since the last sync."""
+        rows = self._db.execute(
+            "SELECT seq, room, payload FROM chat_messages WHERE seq > ? ORDER BY seq",
+            (self._last_seq,),
+        ).fetchall()
+        for seq, room, payload in rows:
+            if seq in self._own:
+                self._own.discard(seq)
+                continue
+            frame = self._frame(seq, payload)
+            self._pending.append((room, frame))
+            if room in self._tails:
+                self._insert_sorted(self._tails[room], seq, frame)
+        if rows:
+            self._last_seq = rows[-1][0]
+
+    def append(self, room, message):
+        """Persist a message dict in room and return its serialized frame (with seq)."""
+        payload = json.dumps(message)
+        tail = self._tail(room)
+        cursor = self._db.execute(
+            "INSERT INTO chat_messages (room, created_at, payload) VALUES (?, ?, ?)",
+            (room, time.time(), payload),
+        )
+        seq = cursor.lastrowid
+        frame = self._frame(seq, payload)
+        if seq == self._last_seq + 1:
+            self._last_seq = seq  # nothing appended elsewhere in between
+        else:
+            self._own.add(seq)
+        self._insert_sorted(tail, seq, frame)
+        self._appends += 1
+        if self._appends % 1000 == 0:
+            self._db.execute("DELETE FROM chat_messages WHERE seq <= ?", (seq - self.retain,))
+        return frame
+
+    def poll(self):
+        """(room, frame) pairs appended by other processes since the last poll, oldest first."""
+        self._sync()
+        pending, self._pending = self._pending, []
+        return pending
+
+    def history(self, room, since=None, limit=50):
+        """Frames in room after seq `since` (or the newest `limit` when since is None), oldest first, at most `limit`."""
+        tail = self._tail(room)
+        self._sync()
+        # a tail that never filled up holds the room's whole history
+        if since is None or len(tail) < tail.maxlen or since >= tail[0][0]:
+            frames = [frame for seq, frame in tail if since is None or seq > since]
+            return frames[:limit] if since is not None else frames[-limit:]
+        rows = self._db.execute(
+            "SELECT seq, payload FROM chat_messages WHERE room = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (room, since, limit),
+        ).fetchall()
+        return [self._frame(seq, payload) for seq, payload in rows]
+
+    def close(self):
+        self._db.close()
+
+
+def history_frame(frames):
+    """One frame carrying a batch of already-serialized chat frames."""
+    return '{"type": "history", "messages": [' + ",".join(frames) + "]}"
@@ -3,14 +3,23 @@
 DBS2 Multiplayer WebSocket Server
 Follows the teacher's WebSocket article: broadcast chat room for DBS2 game.
 Players in the basement can send messages that all connected clients see.
+Clients pick a room with ?room= (basement, minigame:<name>, class:<abbreviation>);
+each room has its own subscribers and history.
+Chat history is persisted (see chat_log.py); every chat frame carries a seq, and
+clients reconnecting with ?since=<seq> get only the messages they missed.
 
 Usage: python dbs2_websocket_server.py
+       WS_WORKERS=4 python dbs2_websocket_server.py  (one process per core)
 Runs on ws://localhost:8765 (dev) or ws://0.0.0.0:8765 (prod)
 """
 import asyncio
 import json
+import multiprocessing
 import os
-from websockets.exceptions import ConnectionClosedOK, ConnectionClosedError
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
 
 try:
     import websockets
@@ -18,97 +27,209 @@ except ImportError:
     print("Install websockets: pip install websockets")
     raise
 
-# Track all connected clients for broadcast
+from chat_log import DEFAULT_ROOM, ChatLog, history_frame
+
+# Track all connected clients (for counts) and each room's subscribers (for broadcast)
 connected = set()
-# Message history so new clients see past messages (bigger apps use a database)
-message_history = []
-MAX_HISTORY = 50  # Keep last N messages
+rooms = {}
+# basement, minigame:<name> or class:<section abbreviation>, e.g. ws://host:8765/?room=minigame:ash_trail
+ROOM_PATTERN = re.compile(r"^(basement|minigame:[a-z0-9_-]{1,32}|class:[A-Za-z0-9_-]{1,32})$")
+# Message history so new clients see past messages, persisted in SQLite (CHAT_DB)
+MAX_HISTORY = 50  # Messages replayed to a new client
+MAX_RESUME = 500  # Messages replayed to a reconnecting client (?since=<seq>)
+chat_log = ChatLog(tail_size=MAX_RESUME)
+# Every chat log call runs on this one thread, never on the event loop: a write waiting on
+# another worker's lock (up to the 5 s busy timeout) then delays only chat persistence
+chat_log_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-log")
+# How often to pick up messages other worker processes wrote to the shared log
+POLL_INTERVAL = float(os.environ.get("WS_POLL_INTERVAL", "0.05"))
+# Drop policy: a client whose unsent bytes exceed this misses new messages until it catches up,
+# and is closed by the ping timeout if it never does
+MAX_CLIENT_BUFFER = int(os.environ.get("WS_MAX_CLIENT_BUFFER", str(256 * 1024)))
+
+
+def build_chat_message(raw):
+    """Parse an incoming frame into a chat message dict, or None if it's empty."""
+    # Accept JSON { "name": "...", "text": "..." } or plain string
+    name = "Anonymous"
+    text = str(raw)
+    if isinstance(raw, str) and raw.strip().startswith("{"):
+        try:
+            data = json.loads(raw)
+            name = str(data.get("name", "Anonymous"))
+            text = str(data.get("text", str(data)))
+        except (json.JSONDecodeError, AttributeError):
+            # Plain text fallback
+            pass
+    if not text.strip():
+        return None
+    return {
+        "type": "chat",
+        "name": name[:32],
+        "text": text[:500],
+    }
+
+
+def query_params(websocket):
+    """Query parameters of the connection URL, e.g. {'room': ['basement'], 'since': ['42']}."""
+    request = getattr(websocket, "request", None)
+    path = request.path if request is not None else getattr(websocket, "path", "")
+    return parse_qs(urlsplit(path or "").query)
+
+
+def requested_since(params):
+    """The since=<seq> query parameter, or None."""
+    values = params.get("since")
+    try:
+        return max(0, int(values[0])) if values else None
+    except ValueError:
+        return None
+
+
+def requested_room(params):
+    """The room=<name> query parameter, or the basement if it's missing or invalid."""
+    values = params.get("room")
+    room = values[0] if values else DEFAULT_ROOM
+    return room if ROOM_PATTERN.match(room) else DEFAULT_ROOM
+
+
+def welcome_text(room):
+    if room.startswith("minigame:"):
+        return f"Welcome to DBS2 Multiplayer Chat! Type to talk with other players in the {room[9:]} minigame."
+    if room.startswith("class:"):
+        return f"Welcome to DBS2 Multiplayer Chat! Type to talk with your {room[6:]} classmates."
+    return "Welcome to DBS2 Multiplayer Chat! Type to talk with other players in the basement."
+
+
+async def in_chat_log(method, *args):
+    """Run a chat_log method on the chat log thread."""
+    return await asyncio.get_running_loop().run_in_executor(chat_log_thread, method, *args)
+
+
+def _write_buffer_size(client):
+    transport = getattr(client, "transport", None)
+    return transport.get_write_buffer_size() if transport is not None else 0
+
+
+def broadcast(clients, msg):
+    """Send one pre-serialized message to every client without awaiting any of them.
+
+    Frames are queued on each connection's transport, so a slow client can't delay the
+    ones after it; clients already holding more than MAX_CLIENT_BUFFER unsent bytes are
+    skipped for this message.
+    """
+    websockets.broadcast(
+        [c for c in clients if _write_buffer_size(c) <= MAX_CLIENT_BUFFER],
+        msg,
+    )
 
 
 async def broadcast_handler(websocket):
-    """Handle a connected client: welcome, replay history, then broadcast incoming messages."""
+    """Handle a connected client: welcome, replay history, then broadcast incoming messages to its room."""
+    params = query_params(websocket)
+    room = requested_room(params)
+    subscribers = rooms.setdefault(room, set())
+    subscribers.add(websocket)
     connected.add(websocket)
     remote = websocket.remote_address
-    print(f"[DBS2 WS] Client connected: {remote}, total: {len(connected)}")
+    print(f"[DBS2 WS] Client connected: {remote} to {room}, total: {len(connected)}")
 
-    # Send welcome message
-    await websocket.send(json.dumps({
-        "type": "system",
-        "message": "Welcome to DBS2 Multiplayer Chat! Type to talk with other players in the basement.",
-    }))
-
-    # Replay past messages so new client is up to speed
-    for msg in message_history[-MAX_HISTORY:]:
+    try:
+        # Send welcome message
+        await websocket.send(json.dumps({
+            "type": "system",
+            "room": room,
+            "message": welcome_text(room),
+        }))
+
+        # Replay past messages in one frame: the newest MAX_HISTORY, or what a reconnecting client missed
+        since = requested_since(params)
         try:
-            await websocket.send(msg)
-        except Exception:
-            break
+            frames = await in_chat_log(chat_log.history, room, since, MAX_HISTORY if since is None else MAX_RESUME)
+        except sqlite3.Error as e:
+            print(f"[DBS2 WS] History error: {e}")
+            frames = []
+        await websocket.send(history_frame(frames))
 
-    try:
         async for raw in websocket:
+            message = build_chat_message(raw)
+            if message is None:
+                continue
             try:
-                # Accept JSON { "name": "...", "text": "..." } or plain string
-                if isinstance(raw, str) and raw.strip().startswith("{"):
-                    data = json.loads(raw)
-                    name = data.get("name", "Anonymous")
-                    text = data.get("text", str(data))
-                else:
-                    name = "Anonymous"
-                    text = str(raw)
-
-                if not text.strip():
-                    continue
-
-                # Build broadcast message
-                msg = json.dumps({
-                    "type": "chat",
-                    "name": name[:32],
-                    "text": text[:500],
-                })
-                message_history.append(msg)
-                if len(message_history) > MAX_HISTORY:
-                    message_history.pop(0)
-
-                print(f"[DBS2 WS] Broadcast from {name}: {text[:50]}...")
-
-                # Broadcast to all connected clients
-                to_remove = set()
-                for client in connected:
-                    try:
-                        await client.send(msg)
-                    except (ConnectionClosedOK, ConnectionClosedError):
-                        to_remove.add(client)
-                for dead in to_remove:
-                    connected.discard(dead)
-            except json.JSONDecodeError:
-                # Plain text fallback
-                msg = json.dumps({"type": "chat", "name": "Anonymous", "text": str(raw)[:500]})
-                message_history.append(msg)
-                if len(message_history) > MAX_HISTORY:
-                    message_history.pop(0)
-                for client in connected:
-                    try:
-                        await client.send(msg)
-                    except (ConnectionClosedOK, ConnectionClosedError):
-                        pass
+                frame = await in_chat_log(chat_log.append, room, message)
+            except sqlite3.Error as e:
+                # e.g. database is locked: tell the sender, keep the connection open
+                print(f"[DBS2 WS] Chat log error: {e}")
+                await websocket.send(json.dumps({
+                    "type": "system",
+                    "room": room,
+                    "message": "Message not sent, please try again.",
+                }))
+                continue
+            broadcast(subscribers, frame)
+    except websockets.ConnectionClosed:
+        pass
     finally:
         connected.discard(websocket)
+        subscribers.discard(websocket)
+        if not subscribers and rooms.get(room) is subscribers:
+            del rooms[room]
         print(f"[DBS2 WS] Client disconnected: {remote}, total: {len(connected)}")
 
 
-async def main():
+async def relay_other_workers():
+    """Deliver messages other worker processes appended to the shared log to this process's subscribers."""
+    while True:
+        await asyncio.sleep(POLL_INTERVAL)
+        try:
+            for room, frame in await in_chat_log(chat_log.poll):
+                subscribers = rooms.get(room)
+                if subscribers:
+                    broadcast(subscribers, frame)
+        except Exception as e:
+            print(f"[DBS2 WS] Relay error: {e}")
+
+
+async def serve(host, port, reuse_port=False):
+    relay = asyncio.create_task(relay_other_workers())
+    try:
+        async with websockets.serve(
+            broadcast_handler,
+            host,
+            port,
+            ping_interval=10,
+            ping_timeout=5,
+            reuse_port=reuse_port,
+        ):
+            print(f"[DBS2 WS] Server listening on ws://{host}:{port} (pid {os.getpid()})")
+            await asyncio.Future()
+    finally:
+        relay.cancel()
+
+
+def run_worker(host, port):
+    asyncio.run(serve(host, port, reuse_port=True))
+
+
+def main():
     host = os.environ.get("WS_HOST", "0.0.0.0")
     port = int(os.environ.get("WS_PORT", "8765"))
-    async with websockets.serve(
-        broadcast_handler,
-        host,
-        port,
-        ping_interval=10,
-        ping_timeout=5,
-    ):
-        print(f"[DBS2 WS] Server listening on ws://{host}:{port}")
-        await asyncio.Future()
+    # WS_WORKERS > 1: one process per worker on an SO_REUSEPORT listener; the kernel spreads
+    # connections across them and the shared chat log relays each room's messages between them
+    workers = int(os.environ.get("WS_WORKERS", "1"))
+    if workers <= 1:
+        asyncio.run(serve(host, port))
+        return
+    context = multiprocessing.get_context("spawn")  # each worker opens its own chat log connection
+    processes = [context.Process(target=run_worker, args=(host, port), daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -0,0 +1,98 @@
+"""
+Incrementally maintained leaderboard for the socket server.
+
+Members are kept in a bisect-maintained list of (-score, member) keys plus a
+member -> (key, data) dict, so an update is two binary searches (plus a list
+memmove) instead of a full re-sort, and rank lookups are O(log n). Every
+mutation returns the span of ranks whose occupant may have changed, so callers
+can push just that window to clients instead of the whole board.
+
+Scores must be finite: a NaN key compares false both ways and breaks the
+sorted-list invariant, so update() rejects it.
+"""
+import bisect
+import math
+
+
+class RankedBoard:
+
+    def __init__(self):
+        self._keys = []      # sorted (-score, member)
+        self._entries = {}   # member -> (key, data)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, member):
+        return member in self._entries
+
+    def clear(self):
+        self._keys = []
+        self._entries = {}
+
+    def _index(self, key):
+        """Index of an existing key; rebuilds the list if it isn't where bisect says it is."""
+        index = bisect.bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            return index
+        # Sorted order was broken; never delete whatever key happens to sit at index
+        self._keys = sorted(entry[0] for entry in self._entries.values())
+        return bisect.bisect_left(self._keys, key)
+
+    def update(self, member, score, data=None):
+        """Set member's score; returns the changed (lo, hi) 0-based index span, or None if nothing moved."""
+        if not math.isfinite(score):
+            raise ValueError(f"score must be finite, got {score!r}")
+        key = (-score, member)
+        old = self._entries.get(member)
+        if old is not None:
+            if old[0] == key:
+                self._entries[member] = (key, data)
+                if old[1] == data:
+                    return None
+                index = self._index(key)
+                return index, index
+            old_index = self._index(old[0])
+            del self._keys[old_index]
+        new_index = bisect.bisect_left(self._keys, key)
+        self._keys.insert(new_index, key)
+        self._entries[member] = (key, data)
+        if old is None:
+            # everyone from the new position down moved one rank
+            return new_index, len(self._keys) - 1
+        return min(old_index, new_index), max(old_index, new_index)
+
+    def remove(self, member):
+        """Drop member; returns the changed (lo, hi) span (hi may be past the new end), or None."""
+        old = self._entries.get(member)
+        if old is None:
+            return None
+        index = self._index(old[0])
+        del self._entries[member]
+        del self._keys[index]
+        return index, len(self._keys)
+
+    def rank(self, member):
+        """1-based rank, or None if member isn't on the board"""
+        entry = self._entries.get(member)
+        if entry is None:
+            return None
+        return bisect.bisect_left(self._keys, entry[0]) + 1
+
+    def lowest(self):
+        """Member at the bottom of the board, or None if empty"""
+        return self._keys[-1][1] if self._keys else None
+
+    def score(self, member):
+        entry = self._entries.get(member)
+        return None if entry is None else -entry[0][0]
+
+    def window(self, lo, hi):
+        """Entries at 0-based indexes lo..hi inclusive: [{'rank', 'member', 'score', 'data'}]"""
+        return [
+            {'rank': index + 1, 'member': member, 'score': -neg_score, 'data': self._entries[member][1]}
+            for index, (neg_score, member) in enumerate(self._keys[lo:hi + 1], start=lo)
+        ]
+
+    def top(self, limit):
+        return self.window(0, limit - 1)
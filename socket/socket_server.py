@@ -1,6 +1,15 @@
 # imports from flask
-from flask_socketio import SocketIO, send, emit
-from flask import Flask
+import hmac
+import json
+import math
+import os
+import threading
+import urllib.request
+
+from flask_socketio import SocketIO, send, emit, join_room, leave_room
+from flask import Flask, request
+
+from ranked_board import RankedBoard
 
 app = Flask(__name__)
 
@@ -13,41 +22,249 @@ socketio = SocketIO(app, cors_allowed_origins=[
 ])
 
 
-players = []  # Keep a list of players and scores
+# Players and scores: name -> entry dict plus rank order, O(log n) to update or rank
+players = RankedBoard()
+
+
+def _player_entries(window):
+    return [{"name": e["member"], "score": e["score"], "rank": e["rank"]} for e in window]
+
+
+def _emit_player_window(span):
+    # Only the ranks whose occupant changed; clients replace ranks from_rank.. and truncate to size
+    lo, hi = span
+    emit("leaderboard_window", {
+        "from_rank": lo + 1,
+        "entries": _player_entries(players.window(lo, hi)),
+        "size": len(players),
+    }, broadcast=True)
+
 
 @socketio.on("player_join")
 def handle_player_join(data):
     name = data.get("name")
     if name:
-        players.append({"name": name, "score": 0})
+        name = str(name)
+        if name not in players:
+            span = players.update(name, 0)
+            _emit_player_window(span)
         emit("player_joined", {"name": name}, broadcast=True)
 
 @socketio.on("player_score")
 def handle_player_score(data):
-    name = data.get("name")
-    score = data.get("score", 0)
-    for p in players:
-        if p["name"] == name:
-            p["score"] = score
-            break
-    # Sort and broadcast leaderboard
-    leaderboard = sorted(players, key=lambda x: x["score"], reverse=True)
-    emit("leaderboard_update", leaderboard, broadcast=True)
+    name = str(data.get("name"))
+    try:
+        score = float(data.get("score", 0))
+    except (TypeError, ValueError):
+        return
+    # float() accepts "nan" / "inf", which would break the board's sort order
+    if not math.isfinite(score) or name not in players:
+        return
+    span = players.update(name, score)
+    if span is not None:
+        _emit_player_window(span)
+
+@socketio.on("get_rank")
+def handle_get_rank(data):
+    name = str(data.get("name"))
+    emit("player_rank", {"name": name, "rank": players.rank(name), "score": players.score(name)})
 
 @socketio.on("clear_leaderboard")
 def handle_clear_leaderboard():
-    global players
-    players = []
-    emit("leaderboard_update", players, broadcast=True)
+    players.clear()
+    emit("leaderboard_update", [], broadcast=True)
 
 @socketio.on("get_leaderboard")
 def handle_get_leaderboard():
-    # Sort and emit current leaderboard
-    leaderboard = sorted(players, key=lambda x: x["score"], reverse=True)
-    emit("leaderboard_update", leaderboard)
+    # Full snapshot for a (re)connecting client; later changes arrive as leaderboard_window
+    emit("leaderboard_update", _player_entries(players.top(len(players))))
+
+
+# ==================== LIVE DBS2 LEADERBOARDS ====================
+# The Flask backend POSTs committed score/wallet deltas to /leaderboard/publish
+# (model/dbs2_leaderboard_publisher.py). Each board ('crypto', 'game:<name>') holds
+# the top LIVE_WINDOW players in a RankedBoard keyed by user id; subscribers get a
+# snapshot on subscribe, then only the rank slots that changed:
+#   leaderboard_diff {"board", "from_rank", "entries": [...], "size"}
+# Clients overwrite their ranks from_rank.. with entries and truncate to size (the
+# number of ranked players shown, at most LIVE_WINDOW). When a change can't be
+# applied exactly (a cached player falls below the window, where unloaded players
+# may outrank them) the board is reloaded and a new leaderboard_snapshot is sent.
+
+DBS2_API_URL = os.environ.get("DBS2_API_URL", "http://localhost:8403")  # the Flask backend
+LEADERBOARD_PUSH_TOKEN = os.environ.get("LEADERBOARD_PUSH_TOKEN")
+LIVE_WINDOW = 100  # ranks pushed to clients; matches the API's max ?limit=
+RELOAD = "reload"
+
+
+class _LiveBoard:
+    """Top-LIVE_WINDOW window of one ranking (same capacity rule as model/dbs2_leaderboard_cache._Board)."""
+
+    def __init__(self, rows):
+        self.ranked = RankedBoard()
+        for user_id, score, info in rows:
+            self.ranked.update(user_id, score, info)
+        self.complete = len(self.ranked) < LIVE_WINDOW  # True when the window holds every ranked player
+
+    def apply(self, user_id, score, info):
+        """Apply one change; returns the changed index span, None, or RELOAD if the window can't be kept exact."""
+        ranked = self.ranked
+        present = user_id in ranked
+        if score is None:
+            span = ranked.remove(user_id)
+            if span is not None and not self.complete:
+                return RELOAD  # an unloaded player moves up into the window
+            return span
+        span = ranked.update(user_id, score, info)
+        if not self.complete and ranked.rank(user_id) == len(ranked):
+            # At the bottom of a partial window: an unloaded player may rank above it
+            ranked.remove(user_id)
+            return RELOAD if present else None
+        if len(ranked) > LIVE_WINDOW:
+            ranked.remove(ranked.lowest())
+            self.complete = False
+        return span
+
+    def snapshot(self):
+        return self.ranked.top(LIVE_WINDOW), len(self.ranked)
+
+
+boards = {}  # board name -> _LiveBoard of user_id -> {"uid", "name"}
+boards_lock = threading.Lock()
+
+
+def _room(board):
+    return "leaderboard:" + board
+
+
+def _valid_board(board):
+    return board == "crypto" or (isinstance(board, str) and board.startswith("game:") and 5 < len(board) <= 64)
+
+
+def _fetch_board(board):
+    """Current top LIVE_WINDOW rows from the Flask API: [(user_id, score, entry)]"""
+    if board == "crypto":
+        url = f"{DBS2_API_URL}/api/dbs2/leaderboard?limit={LIVE_WINDOW}"
+    else:
+        url = f"{DBS2_API_URL}/api/dbs2/leaderboard/minigame?game={board[5:]}&limit={LIVE_WINDOW}"
+    with urllib.request.urlopen(url, timeout=5) as response:
+        rows = json.load(response).get("leaderboard", [])
+    result = []
+    for row in rows:
+        info = row.get("user_info") or {}
+        user_id = row.get("user_id", info.get("id"))
+        if user_id is None:
+            continue
+        score = row.get("crypto", 0) if board == "crypto" else row.get("score", 0)
+        result.append((user_id, score or 0, {"uid": info.get("uid"), "name": info.get("name")}))
+    return result
+
+
+def _load_board(board):
+    try:
+        rows = _fetch_board(board)
+    except Exception as e:
+        print(f"[leaderboard] Could not load {board}: {e}")
+        rows = []
+    live = _LiveBoard(rows)
+    with boards_lock:
+        boards[board] = live
+        return live.snapshot()
+
+
+def _entries(window):
+    return [{"rank": e["rank"], "user_id": e["member"], "score": e["score"], "user_info": e["data"]} for e in window]
+
+
+def _emit_snapshot(board, top, size, to):
+    socketio.emit("leaderboard_snapshot", {"board": board, "entries": _entries(top), "size": size}, to=to)
+
+
+@socketio.on("leaderboard_subscribe")
+def handle_leaderboard_subscribe(data):
+    board = (data or {}).get("board", "crypto")
+    if not _valid_board(board):
+        emit("leaderboard_error", {"message": f"Unknown board {board}"})
+        return
+    join_room(_room(board))
+    with boards_lock:
+        live = boards.get(board)
+        snapshot = live.snapshot() if live is not None else None
+    if snapshot is None:
+        snapshot = _load_board(board)
+    _emit_snapshot(board, *snapshot, to=request.sid)
+
+
+@socketio.on("leaderboard_unsubscribe")
+def handle_leaderboard_unsubscribe(data):
+    leave_room(_room((data or {}).get("board", "crypto")))
+
+
+def apply_deltas(deltas):
+    """Apply deltas to the loaded boards.
+
+    Returns ({board: (lo, hi, window, size)} for changed ranks, {boards to reload}).
+    """
+    spans = {}
+    reload = set()
+    with boards_lock:
+        for delta in deltas:
+            user_id = delta.get("user_id")
+            if user_id is None:
+                continue
+            for name, live in boards.items():
+                if name in reload:
+                    continue
+                score = None if delta.get("removed") else (delta.get("boards") or {}).get(name)
+                span = live.apply(user_id, score, {"uid": delta.get("uid"), "name": delta.get("name")})
+                if span == RELOAD:
+                    reload.add(name)
+                    spans.pop(name, None)
+                    continue
+                if span is None:
+                    continue
+                lo, hi = span
+                if name in spans:
+                    lo, hi = min(lo, spans[name][0]), max(hi, spans[name][1])
+                spans[name] = (lo, min(hi, LIVE_WINDOW - 1))
+        changed = {}
+        for name, (lo, hi) in spans.items():
+            ranked = boards[name].ranked
+            changed[name] = (lo, hi, ranked.window(lo, hi), len(ranked))
+        return changed, reload
+
+
+@app.route("/leaderboard/publish", methods=["POST"])
+def leaderboard_publish():
+    """Deltas from the Flask backend: {"reset": bool, "deltas": [...]}"""
+    if LEADERBOARD_PUSH_TOKEN:
+        if not hmac.compare_digest(request.headers.get("X-Leaderboard-Token", ""), LEADERBOARD_PUSH_TOKEN):
+            return {"message": "Forbidden"}, 403
+    elif request.remote_addr not in ("127.0.0.1", "::1"):
+        return {"message": "Forbidden"}, 403
+    body = request.get_json(silent=True) or {}
+
+    if body.get("reset"):
+        with boards_lock:
+            names = list(boards)
+        for name in names:
+            _emit_snapshot(name, *_load_board(name), to=_room(name))
+
+    changed, reload = apply_deltas(body.get("deltas") or [])
+    for name in reload:
+        # The Flask side has already committed these deltas, so a reload picks them up
+        _emit_snapshot(name, *_load_board(name), to=_room(name))
+    for name, (lo, hi, window, size) in changed.items():
+        socketio.emit("leaderboard_diff", {
+            "board": name,
+            "from_rank": lo + 1,
+            "entries": _entries(window),
+            "size": size,
+        }, to=_room(name))
+    return {"status": "ok"}, 200
 
 
 # this runs the flask application on the development server
 if __name__ == "__main__":
     # change name for testing
-    socketio.run(app, debug=True, host="0.0.0.0", port=8403)
+    socketio.run(app, debug=True, host="0.0.0.0", port=int(os.environ.get("SOCKET_PORT", "8404")))